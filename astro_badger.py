@@ -10,65 +10,61 @@
 
 """
 Python script to grab astronomical data and displays them on Badger 2040 : 
-- planets ephemeris
-- Moon phase
-- ISS position
+- planets ephemeris, fetched a week at once and kept in the store (store_badger.py) by day, the next week fetched in background before the days stored run out
+- Moon phase (drawn from the phase angle, no image needed)
+- ISS position (live mode: the crosshair moves every ISS_LIVE_PERIOD seconds with a ground track, the map under it being redrawn from a 1-bit copy in RAM (astricons/world_map_m.bin) with no JPEG decode and the changed parts of the screen updated in as few partial updates as possible, for ISS_LIVE_AWAKE seconds before halting)
 
 Fetches info from :
 - Ephemeris data from IMCCE (More info: http://vo.imcce.fr/webservices/miriade/?rts#KnownBodies)
 - ISS location data from open-notify.org/iss-now.json
 
 Requires 
-- Moon phase images in  /Phases/
 - World map in /astricons/world_map_m.jpg
+- Locale resource files in /locale/
 - common_badger.py library of common functions and data
+- clock_badger.py clock service
+- calc_badger.py helpers compiled to native code
 - Set LAT, LONG, LOCATION, COUNTRY and TIMEZONE in common_badger.py
 
 """
 
 import badger2040w as badger2040
 import jpegdec
-from time import localtime, time
-from ntptime import settime
+from time import time, sleep_ms, localtime
+from math import cos, radians, sqrt
 
 from common_badger import *
+from clock_badger import sync_clock, current_strings
+from sources_badger import ISS_URL, EPHEM_DAYS, ephem_source, ephem_day_key, moon_source
+from stats_badger import stats_jpeg, stats_halt
+from store_badger import store_put, store_get, store_time, store_delete, store_keys
+from mem_badger import mem_register, mem_update, MEM_CACHE
+from loop_badger import run_page, ready, data_lock
+from calc_badger import hm_convert, day_x, map_x, map_y
 
 VERBOSE = True
 
-EPHEM_URL = "https://vo.imcce.fr/webservices/miriade/rts_query.php?-mime=text&-ep=%s&-body=1,2,4,5,6,10,11&-long=%s&-lat=%s"
-MOON_URL = "https://vo.imcce.fr/webservices/miriade/ephemcc_query.php?-mime=json&-ep=%s-%s&-name=s:moon"
-
-ISS_URL = 'http://api.open-notify.org/iss-now.json'
 ISS_MAP = "/astricons/world_map_m.jpg"
-MOONDIR = '/phases/'
-
-current = {}
+ISS_MAP_BITS = "/astricons/world_map_m.bin"     # 1-bit copy of the map: 22 bytes per row, MSB first, 1 for black
+MAP_ROW = 22
+MOON_R = 50            # Radius of the moon drawn on the Moon tab
 
-if COUNTRY == 'Fr':
-    TAB_NAMES = ["Ephemérides", "ISS", "Lune"]
-    dirs_cr = ['PL', 'gp', 'pq', 'ppq', 'NL']
-    dirs_dc = ['PL', 'gd', 'dq', 'ddq', 'NL']
+ISS_LIVE_PERIOD = 10    # Seconds between two moves of the ISS crosshair on the ISS tab (0 for no live mode)
+ISS_FIX_PERIOD = 60     # Seconds between two ISS positions fetched in live mode, extrapolated in between
+ISS_TRACK_NB = 12       # Number of past positions shown as ground track in live mode
+ISS_LIVE_AWAKE = 120    # Seconds in live mode after the last button press before halting
+ISS_INCLINATION = 51.6
 
-else:
-    TAB_NAMES = ["Ephemeris", "ISS", "Moon"]
-    dirs_cr = ['full', 'GF', 'FQ', 'FFQ', 'new']
-    dirs_dc = ['full', 'GL', 'LQ', 'LLQ', 'new']
-
-jpg_cr = ['full', 'gp', 'pq', 'ppq', 'new']
-jpg_dc = ['full', 'gd', 'dq', 'ddq', 'new']
+current = {}
+iss_ok = False
+ephem_ok = False
+moon_ok = False
 
 body_list = ["Sun", "Moon", "Venus", "Mars", "Jupiter", "Saturn"]
-body_list_fr = {
-    "Sun": "Soleil",
-    "Moon": "Lune",
-    "Mercury": "Mercure",
-    "Venus": "Venus",
-    "Mars": "Mars",
-    "Jupiter": "Jupiter",
-    "Saturn": "Saturne"
-}
 
-TAB_NB = len(TAB_NAMES)
+TAB_NB = 3     # Ephemeris, ISS and Moon, named in the locale table
+BUTTONS = (badger2040.BUTTON_A, badger2040.BUTTON_B, badger2040.BUTTON_C,
+           badger2040.BUTTON_UP, badger2040.BUTTON_DOWN)
 tab = 1 # Let's start with "ISS" tab !
 
 # Display Setup
@@ -84,126 +80,210 @@ jpeg = jpegdec.JPEG(display.display)
 #-------------------------------------------------
 
 def currenttime():
-    '''Retrieves current time and stores it in current'''
+    '''Syncs the clock if needed and stores current date and time strings in current'''
     
     global current
 
-    for i in range(TRY_NB):
-        try:
-            settime()
-            break
-        except:
-            print_debug("Attempt %s to connect" % (i))
-            display.connect()
-        
-    dt = localtime()
-    date_ymd = "%s-%s-%s" % (dt[0], dt[1], dt[2])
-    date_dm = "%s/%s" % (dt[2], dt[1])
-    time_hm = '{:02d}:{:02d}'.format((dt[3]+TIMEZONE)%24, dt[4])
-    wd = WEEKDAYS[dt[6]]
-    dt1 = localtime(time()+56400)
-    date_ymd1 = "%s-%s-%s" % (dt1[0], dt1[1], dt1[2])
-    current = {
-        "date_ymd": date_ymd,
-        "date_ymd1": date_ymd1,
-        "date_dm": date_dm,
-        "time_hm": time_hm,
-        "wd": wd
-    }
+    sync_clock(display)
+    current = current_strings()
     return
 
 
-def hm_local_convert(hm):
-    '''Converts UT string into local time string'''
+def hm_local_convert(minutes):
+    '''Converts UT minutes of the day (None if missing) into local time and its string'''
     
-    hm_split = hm.split(':')
-    try:
-        h = (int(hm_split[0]) + TIMEZONE) % 24
-        m = int(hm_split[1])
-    except:
-        h = 0
-        m = 0
-    return h, m, "{:02d}:{:02d}".format(h, m)
+    return hm_convert(minutes, TIMEZONE)
 
 
 #----- Ephemeris data
 
+EPHEM_MARGIN = 2        # Days left in the store when the next days are fetched in background
+EPHEM_BODIES = [body.encode() for body in body_list]
+
 ephem_data = {}
+ephem_parse = {
+    "days": {},         # Date: {body: [rise, set]}, UT minutes of the day (None if it does not rise or set)
+    "filled": 0         # Days of bodies whose rise and set are both filled
+}
 
 
-def read_astro(text):
-    '''Parses the ephemeris text'''
+def ephem_date(t):
+    '''Returns the date (UT) of time t, as in the current strings'''
 
-    global ephem_data
+    dt = localtime(t)
+    return "%s-%s-%s" % (dt[0], dt[1], dt[2])
 
-    for text_line in text.split('\n'):
-        if not text_line or text_line[0] == '#':
-            continue
-        body_ephem = text_line.split(',')
-        body = body_ephem[0]
 
-        if COUNTRY == 'Fr':
-            body_name = body_list_fr[body.strip()]
-        else:
-            body_name = body.strip()
-
-        try:    # If data already exists for body, keep only the most relevant ones
-            if ephem_data[body]['rise'] == '-':
-                ephem_data[body]['rise'] = body_ephem[2].strip()
-            if ephem_data[body]['trans'] == '-':
-                ephem_data[body]['trans'] = body_ephem[4].strip()
-            if ephem_data[body]['set'] == '-':
-                ephem_data[body]['set'] = body_ephem[6].strip()
-        except:
+def ephem_minutes(hms):
+    '''Converts a UT time (b'hh:mm:ss') into minutes of the day, None if missing (b'-')'''
+
+    try:
+        h, m = hms.split(b':')[:2]
+        return int(h) * 60 + int(m)
+    except ValueError:
+        return None
+
+
+def read_astro_line(line):
+    '''Parses a line of the ephemeris text (body, date, rise, azimuth, transit, elevation, set, azimuth) into
+    ephem_parse, returns True once the rise and set of all the bodies shown are filled for EPHEM_DAYS days'''
+
+    # Comments are skipped before copying the line (a view on the line buffer), bodies not shown before splitting it
+    if not len(line) or line[0] == 35:     # '#'
+        return False
+    line = bytes(line)
+    comma = line.find(b',')
+    if comma < 0:
+        return False
+    body = line[:comma].strip()
+    if body not in EPHEM_BODIES:
+        return False
+    fields = line.split(b',', 7)
+    if len(fields) < 8:
+        return False
+    try:
+        y, m, d = fields[1].strip()[:10].split(b'-')
+        date = "%s-%s-%s" % (int(y), int(m), int(d))
+    except ValueError:
+        return False
+
+    rise_set = ephem_parse["days"].setdefault(date, {}).setdefault(body.decode(), [None, None])
+    if rise_set[0] is not None and rise_set[1] is not None:
+        return False
+    # If data already exists for body, keep only the most relevant ones
+    if rise_set[0] is None:
+        rise_set[0] = ephem_minutes(fields[2].strip())
+    if rise_set[1] is None:
+        rise_set[1] = ephem_minutes(fields[6].strip())
+    if rise_set[0] is not None and rise_set[1] is not None:
+        ephem_parse["filled"] += 1
+    return ephem_parse["filled"] >= EPHEM_DAYS * len(body_list)
+
+
+def ephem_field(minutes):
+    '''Returns the stored text of a time in minutes'''
+
+    return '-' if minutes is None else str(minutes)
+
+
+def ephem_save(days):
+    '''Stores the ephemeris of each day, one line per body, dropping the days past'''
+
+    for date in days:
+        lines = ["%s,%s,%s" % (body, ephem_field(rise_t), ephem_field(set_t)) for body, (rise_t, set_t) in days[date].items()]
+        store_put(ephem_day_key(date), '\n'.join(lines).encode())
+        print_debug("Ephemeris of %s stored" % (date))
+    for key in store_keys(ephem_day_key('')):
+        if time() - store_time(key) > 2 * EPHEM_DAYS * 86400:
+            store_delete(key)
+    return
+
+
+def ephem_load(date):
+    '''Loads the ephemeris of date from the store into ephem_data, returns False if not stored'''
+
+    value = store_get(ephem_day_key(date))
+    if value is None:
+        return False
+    bodies = locale("astro")["bodies"]
+    ephem_data.clear()
+    try:
+        for line in str(value, 'utf-8').split('\n'):
+            body, rise_t, set_t = line.split(',')
             ephem_data[body] = {
-                'body': body_name,
-                'date': body_ephem[1].strip(),
-                'rise': body_ephem[2].strip(),
-                'az_rise': body_ephem[3].strip(),
-                'trans': body_ephem[4].strip(),
-                'elev': body_ephem[5].strip(),
-                'set': body_ephem[6].strip(),
-                'az_set': body_ephem[7].strip()
+                'body': bodies.get(body, body),
+                'date': date,
+                'rise': None if rise_t == '-' else int(rise_t),
+                'set': None if set_t == '-' else int(set_t)
             }
+            print_debug("%s@%s: %s, %s" % (ephem_data[body]['body'], date, rise_t, set_t))
+    except ValueError:
+        # Record of an older format: fetched again
+        store_delete(ephem_day_key(date))
+        ephem_data.clear()
+        return False
+    return True
 
-        print_debug("%s@%s: %s@%s, %s@%s, %s@%s" %(
-            ephem_data[body]['body'], 
-            ephem_data[body]['date'], 
-            ephem_data[body]['rise'], 
-            ephem_data[body]['az_rise'],
-            ephem_data[body]['trans'],
-            ephem_data[body]['elev'],
-            ephem_data[body]['set'],
-            ephem_data[body]['az_set']))
-        
-    return
+
+def ephem_days_left():
+    '''Returns the number of days stored from today'''
+
+    t = time()
+    n = 0
+    while store_time(ephem_day_key(ephem_date(t + n * 86400))) is not None:
+        n += 1
+    return n
+
+
+async def fetch_ephem(date):
+    '''Fetches from IMCCE the ephemeris of the EPHEM_DAYS days from date into the store'''
+
+    key, url = ephem_source(date)
+    ephem_parse["days"] = {}
+    ephem_parse["filled"] = 0
+    if not await afetch_data_lines(display, url, read_astro_line, key):
+        return False
+    ephem_save(ephem_parse["days"])
+    ephem_parse["days"] = {}
+    return True
 
 
-def get_ephem_data():
-    '''Fetches astro data from IMCCE'''
+async def get_ephem_data():
+    '''Gets the ephemeris of the day from the store, fetched from IMCCE first if missing'''
 
     print_entry("Reading astro data...")
 
-    astro_text = fetch_data_text(display, EPHEM_URL %
-                                 (current['date_ymd'], LONG, LAT))
-    if astro_text:
-        read_astro(astro_text)
+    date = current["date_ymd"]
+    with data_lock:
+        ok = ephem_load(date)
+    if not ok:
+        await fetch_ephem(date)
+        with data_lock:
+            ok = ephem_load(date)
+    if ok:
         print_exit("...success reading astro data")
-        return True
     else:
         print_error("...error reding astro data")
-        return False
-     
+    return ok
+
+
+async def refresh_ephem():
+    '''Fetches the next days of ephemeris before the days stored run out'''
+
+    n = ephem_days_left()
+    if 0 < n <= EPHEM_MARGIN:
+        print_debug("Fetching the ephemeris from %s days on" % (n))
+        await fetch_ephem(ephem_date(time() + n * 86400))
+    return
+
 
 #----- ISS data
 
-def get_iss_data():
-    '''Gets the ISS position data'''
+iss_fixes = []          # Last two fixes: device time received, latitude, longitude
+iss_fix_try = 0         # Device time of the last fix fetched in live mode, even if it failed
 
-    global lat_iss, long_iss
+
+def iss_position(t):
+    '''Extrapolates the ISS position at time t from the last two fixes'''
+
+    t1, lat1, long1 = iss_fixes[-1]
+    if len(iss_fixes) < 2 or iss_fixes[0][0] >= t1:
+        return lat1, long1
+    t0, lat0, long0 = iss_fixes[0]
+    k = (t - t1) / (t1 - t0)
+    lat = lat1 + (lat1 - lat0) * k
+    lat = max(-ISS_INCLINATION, min(ISS_INCLINATION, lat))
+    d_long = (long1 - long0 + 180) % 360 - 180
+    long = (long1 + d_long * k + 180) % 360 - 180
+    return lat, long
+
+
+def read_iss(iss_json):
+    '''Parses the ISS position json'''
+
+    global lat_iss, long_iss, iss_fixes
 
     print_entry("Reading ISS data...")
-    iss_json = fetch_data_json(display, ISS_URL)
     if not iss_json:
         print_error("...error reading ISS data")
         return False
@@ -211,6 +291,8 @@ def get_iss_data():
     try:
         lat_iss = float(iss_json['iss_position']['latitude'])
         long_iss = float(iss_json['iss_position']['longitude'])
+        # Stamped with the device time, the one extrapolations are computed from
+        iss_fixes = iss_fixes[-1:] + [(time(), lat_iss, long_iss)]
         print_debug("Position: Lat = %s, Long = %s" % (lat_iss, long_iss))
         print_exit("...success reading ISS data")
         return True
@@ -219,16 +301,24 @@ def get_iss_data():
         return False
 
 
+async def get_iss_data():
+    '''Gets the ISS position data'''
+
+    iss_json = await afetch_data_json(display, ISS_URL)
+    with data_lock:
+        return read_iss(iss_json)
+
+
 #----- Moon data
 
 def calculate_phase(p, p1):
-    '''Calculates moon phase from the phase p of the day and the phase p1 of the next day '''
+    '''Calculates moon phase name and waxing state from the phase angle p of the day and the phase angle p1 of the next day '''
 
     ix = round(p / 45)
-    if p < p1:
-        return dirs_cr[ix], jpg_cr[ix]
+    if p1 < p:  # Phase angle decreasing towards full moon
+        return locale("astro")["waxing"][ix], True
     else:
-        return dirs_dc[ix], jpg_dc[ix]
+        return locale("astro")["waning"][ix], False
 
 
 def read_moon(moon_json):
@@ -246,17 +336,14 @@ def read_moon(moon_json):
         moon_dec = float(moon_json["data"][0]["dec"])
         moon_ra = float(moon_json["data"][0]["ra"])
         
-        # Gets the moon rise local time
-        try:
-            moon_rise_h, moon_rise_m, moon_rise_hm = hm_local_convert(ephem_data['Moon']['rise'])
-        except:
-            moon_rise_hm = ''
-            
-        # Gets the moon set local time
-        try:
-            moon_set_h, moon_set_m, moon_set_hm = hm_local_convert(ephem_data['Moon']['set'])
-        except:
-            moon_set_hm = ''
+        # Gets the moon rise and set local times
+        moon_rise_hm = ''
+        moon_set_hm = ''
+        if 'Moon' in ephem_data:
+            if ephem_data['Moon']['rise'] is not None:
+                moon_rise_h, moon_rise_m, moon_rise_hm = hm_local_convert(ephem_data['Moon']['rise'])
+            if ephem_data['Moon']['set'] is not None:
+                moon_set_h, moon_set_m, moon_set_hm = hm_local_convert(ephem_data['Moon']['set'])
             
         print_debug("Phase = %0.0f, dec = %0.0f, ra = %0.0f, rise = %s, set = %s" %
                   (moon_phase, moon_dec, moon_ra, moon_rise_hm, moon_set_hm))
@@ -290,16 +377,18 @@ def read_phase(moon_json):
         return False
 
 
-def get_moon_data():
+async def get_moon_data():
     '''Gets the Moon phase data'''
     
     print_entry("Getting moon data...")
-    moon_json = fetch_data_json(display, MOON_URL %
-                                (current["date_ymd"], current["time_hm"]))
+    key, url = moon_source(current)
+    moon_json = await afetch_data_json(display, url, key)
     if moon_json:
-        read_moon(moon_json)
-        read_phase(fetch_data_json(display, MOON_URL %
-                                   (current["date_ymd1"], current["time_hm"])))
+        key, url = moon_source(current, True)
+        phase_json = await afetch_data_json(display, url, key)
+        with data_lock:
+            read_moon(moon_json)
+            read_phase(phase_json)
         print_exit("...success getting moon data")
         return True
     else:
@@ -309,18 +398,35 @@ def get_moon_data():
 
 #----- All astro data
 
-def get_astro_data():
-    '''Get the astro data'''
+TAB_DATA = ((0,), (1,), (0, 2))     # Data needed by each tab: the Moon rise and set times are in the ephemeris
+
+
+async def get_tab_data(t):
+    '''Gets the data of tab t, then hands it off to be drawn'''
 
     global iss_ok, ephem_ok, moon_ok
+    if t == 0:
+        ephem_ok = await get_ephem_data()
+    elif t == 1:
+        iss_ok = await get_iss_data()
+    else:
+        moon_ok = await get_moon_data()
+    ready((t,))
+    return
+
+
+async def get_astro_data(tab):
+    '''Get the astro data, the data of tab first'''
+
     print_entry("Getting all astro data...")
-    display.led(128)
-    display_status(display, 'Fetching astro data')
     currenttime()
-    iss_ok = get_iss_data()
-    ephem_ok = get_ephem_data()
-    moon_ok = get_moon_data()
-    display.led(0)
+    fetched = []
+    for t in [tab] + [t for t in range(TAB_NB) if t != tab]:
+        for data_t in TAB_DATA[t]:
+            if data_t not in fetched:
+                await get_tab_data(data_t)
+                fetched.append(data_t)
+    await refresh_ephem()
     print_exit("...success getting all astro data")
     return
 
@@ -348,8 +454,8 @@ def display_visi(body, y):
     display.text(rise_hm, x_0h - 25, y + 6, 20, 1)
     display.text(set_hm, x_24h + 5, y + 6, 20, 1)
     d = x_24h - x_0h
-    r = int((rise_h + rise_m / 60) * d / 24)
-    s = int((set_h + set_m / 60) * d / 24) 
+    r = day_x(rise_h, rise_m, d)
+    s = day_x(set_h, set_m, d)
     if r < s:
         display.rectangle(r + x_0h, y + 8, s - r, 8)
     else:
@@ -381,7 +487,7 @@ def draw_ephem_page():
 
     print_entry("Display ephem info ...")
     display_title(display, "%s %s, %s %s" %
-                  (TAB_NAMES[0], LOCATION, current["wd"], current["date_dm"]))
+                  (locale("astro")["tabs"][0], LOCATION, current["wd"], current["date_dm"]))
 
     if ephem_ok:
         display_astro()
@@ -398,9 +504,88 @@ y_iss_map = 0
 def mapLatLongToXY(lat, lon):
     '''Converts Lat & Lon into x & y position on the map'''
 
-    x = (int)(0.49 * lon + 87.5) % 175 + x_iss_map
-    y = (int)(-0.67 * lat + 60) + y_iss_map
-    return x, y
+    return map_x(round(lon * 100)) + x_iss_map, map_y(round(lat * 100)) + y_iss_map
+
+
+iss_xy = None
+iss_track = []
+iss_map_bits = None     # 1-bit copy of the map in live mode
+
+
+def draw_iss_text():
+    '''Displays the time and the ISS position next to the map'''
+
+    display.set_pen(0)
+    display.text(current["time_hm"], 4, 44)
+    display.text("Lat", 4, 64)
+    if lat_iss < 0:
+        display.text("%0.0f S" % (-lat_iss), 60, 64)
+    else:
+        display.text("%0.0f N" % (lat_iss), 60, 64)
+    display.text("Long", 4, 84)
+    if long_iss < 0:
+        display.text("%0.0f W" % (-long_iss), 60, 84)
+    else:
+        display.text("%0.0f E" % (long_iss), 60, 84)
+    return
+
+
+def draw_iss_cross():
+    '''Displays the ISS crosshair and its ground track over the map'''
+
+    global iss_xy
+
+    iss_xy = mapLatLongToXY(lat_iss, long_iss)
+    x, y = iss_xy
+    print_debug("Lat = %s, Long = %s, x = %s, y = %s" %
+                (lat_iss, long_iss, x, y))
+    display.set_pen(0)
+    for x_track, y_track in iss_track:
+        display.rectangle(x_track, y_track, 2, 2)
+    display.line(x, y_iss_map, x, 120)
+    display.line(x_iss_map, y, 175 + x_iss_map, y)
+    return
+
+
+def load_map_bits():
+    '''Returns the 1-bit copy of the world map read into RAM, None if missing'''
+
+    try:
+        with io_lock:
+            with open(ISS_MAP_BITS, 'rb') as f:
+                return f.read()
+    except OSError:
+        print_error("...no 1-bit copy of the map %s" % (ISS_MAP_BITS))
+        return None
+
+
+def restore_map(regions):
+    '''Redraws the world map in the regions (x, y, w, h) from its 1-bit copy in RAM, as runs of pixels of a color,
+    with no JPEG decode (the whole map is decoded again if the copy is missing)'''
+
+    if iss_map_bits is None:
+        jpeg_open(jpeg, ISS_MAP)
+        jpeg.decode(x_iss_map, y_iss_map, jpegdec.JPEG_SCALE_FULL)
+        stats_jpeg()
+        return
+
+    for x, y, w, h in regions:
+        x0 = max(x, x_iss_map) - x_iss_map
+        x1 = min(x + w, x_iss_map + 175) - x_iss_map
+        for y_map in range(max(y, y_iss_map) - y_iss_map, min(y + h, y_iss_map + 120) - y_iss_map):
+            row = y_map * MAP_ROW
+            start = x0
+            black = -1
+            for x_map in range(x0, x1 + 1):
+                bit = (iss_map_bits[row + x_map // 8] >> (7 - x_map % 8)) & 1 if x_map < x1 else -1
+                if bit != black:
+                    if black >= 0:
+                        display.set_pen(0 if black else 15)
+                        display.rectangle(x_iss_map + start, y_iss_map + y_map, x_map - start, 1)
+                    start = x_map
+                    black = bit
+    display.set_pen(0)
+    return
 
 
 def draw_iss_tab():
@@ -408,63 +593,149 @@ def draw_iss_tab():
 
     print_entry("ISS info display...")
     if iss_ok:
-        display_title(display, TAB_NAMES[1], x_iss_map)
+        display_title(display, locale("astro")["tabs"][1], x_iss_map)
         display.set_pen(0)
         display.text("%s %s" % (current["wd"], current["date_dm"]), 4, 24)
-        display.text(current["time_hm"], 4, 44)
-        display.text("Lat", 4, 64)
-        if lat_iss < 0:
-            display.text("%0.0f S" % (-lat_iss), 60, 64)
-        else:
-            display.text("%0.0f N" % (lat_iss), 60, 64)
-        display.text("Long", 4, 84)
-        if long_iss < 0:
-            display.text("%0.0f W" % (-long_iss), 60, 84)
-        else:
-            display.text("%0.0f E" % (long_iss), 60, 84)
+        draw_iss_text()
 
-        jpeg.open_file(ISS_MAP)
+        jpeg_open(jpeg, ISS_MAP)
         jpeg.decode(x_iss_map, y_iss_map, jpegdec.JPEG_SCALE_FULL)
+        stats_jpeg()
 
-        x, y = mapLatLongToXY(lat_iss, long_iss)
-        print_debug("Lat = %s, Long = %s, x = %s, y = %s" %
-                    (lat_iss, long_iss, x, y))
-        display.set_pen(0)
-        display.line(x, y_iss_map, x, 120)
-        display.line(x_iss_map, y, 175 + x_iss_map, y)
+        draw_iss_cross()
 
     print_exit("...ISS info display completed")
     return
 
 
+def iss_live_tick():
+    '''Moves the ISS crosshair to its extrapolated position, updating only the changed parts of the screen'''
+
+    global current, lat_iss, long_iss, iss_fix_try
+
+    t = time()
+    if t - max(iss_fixes[-1][0], iss_fix_try) >= ISS_FIX_PERIOD:
+        # Next attempt ISS_FIX_PERIOD later even if this one fails (network down)
+        iss_fix_try = t
+        read_iss(fetch_data_json(display, ISS_URL))
+    current = current_strings()
+    lat_iss, long_iss = iss_position(t)
+
+    x_old, y_old = iss_xy
+    if mapLatLongToXY(lat_iss, long_iss) == iss_xy:
+        return
+
+    # Restores the map under the old crosshair and under the track position dropped from its copy in RAM, then redraws
+    # the track (e-ink frame buffer pixels cannot be read back to be saved)
+    regions = [(x_old, y_iss_map, 1, 120), (x_iss_map, y_old, 175, 1)]
+    iss_track.append((x_old, y_old))
+    if len(iss_track) > ISS_TRACK_NB:
+        x_track, y_track = iss_track.pop(0)
+        regions.append((x_track, y_track, 2, 2))
+    restore_map(regions)
+
+    draw_iss_cross()
+    regions.append((iss_xy[0], y_iss_map, 1, 120))
+    regions.append((x_iss_map, iss_xy[1], 175, 1))
+
+    display.set_pen(15)
+    display.rectangle(0, 40, x_iss_map, 60)
+    draw_iss_text()
+    regions.append((0, 40, x_iss_map, 60))
+
+    display_partial(display, regions)
+    return
+
+
+def iss_live():
+    '''Keeps the ISS crosshair moving until a button is pressed, or for ISS_LIVE_AWAKE seconds, returns whether a
+    button was pressed'''
+
+    global iss_map_bits
+
+    print_entry("ISS live mode...")
+    iss_map_bits = load_map_bits()
+    t_start = t_tick = time()
+    try:
+        while time() - t_start < ISS_LIVE_AWAKE:
+            for button in BUTTONS:
+                if display.pressed(button):
+                    print_exit("...ISS live mode stopped")
+                    return True
+            if time() - t_tick >= ISS_LIVE_PERIOD:
+                t_tick = time()
+                iss_live_tick()
+            sleep_ms(50)
+    finally:
+        iss_map_bits = None
+    print_exit("...ISS live mode timed out")
+    return False
+
+
 #----- Moon display
 
 x_moon_map = 180
 y_moon_map = 14
 
+moon_rows = {}
+mem_register("moon_rows", MEM_CACHE, 0, moon_rows.clear)
+
+
+def moon_half_widths(r):
+    '''Returns the half width of each row of a disk of radius r, computed once per radius'''
+
+    if r not in moon_rows:
+        moon_rows[r] = [int(sqrt(r * r - (i - r + 0.5) ** 2) + 0.5) for i in range(2 * r)]
+        mem_update("moon_rows", sum([16 + 8 * len(rows) for rows in moon_rows.values()]))
+    return moon_rows[r]
+
+
+def draw_moon(x, y, r, phase, waxing):
+    '''Draws the moon of radius r centered on x, y, lit according to the phase angle and the waxing state'''
+
+    # Dark disk, then the lit part of each row, from the limb to the terminator (1 pixel inside the limb)
+    display.set_pen(0)
+    display.circle(x, y, r)
+    display.set_pen(15)
+
+    k = cos(radians(phase))
+    lit_right = waxing == (LAT >= 0)
+    y_row = y - r + 1
+    for w in moon_half_widths(r - 1):
+        t = int(w * k)
+        if lit_right:
+            x_start, x_end = x - t, x + w
+        else:
+            x_start, x_end = x - w, x + t
+        if x_end > x_start:
+            display.rectangle(x_start, y_row, x_end - x_start, 1)
+        y_row += 1
+    display.set_pen(0)
+    return
+
+
 def draw_moon_tab():
     '''Displays the moon phase'''
 
     print_entry("Moon info display...")
     if moon_ok:
-        phase_name, phase_jpg = calculate_phase(moon_phase, moon_dec)
-        moon_jpg = MOONDIR + phase_jpg + '.jpg'
-        print_debug("Moon JPG = %s" % (moon_jpg))
-        jpeg.open_file(moon_jpg)
-        jpeg.decode(x_moon_map, y_moon_map, jpegdec.JPEG_SCALE_FULL)
+        phase_name, waxing = calculate_phase(moon_phase, moon_phase1)
+        print_debug("Moon phase = %s, waxing = %s" % (phase_name, waxing))
+        draw_moon(x_moon_map + 4 + MOON_R, y_moon_map + 2 + MOON_R, MOON_R, moon_phase, waxing)
 
-        display_title(display, TAB_NAMES[2], x_moon_map)
+        display_title(display, locale("astro")["tabs"][2], x_moon_map)
 
         display.set_pen(0)
         display.text("%s %s %s" % (current["wd"], current["date_dm"], current["time_hm"]), 4, 24)
         display.text("Phase: %0.0f° (%s)" % (moon_phase, phase_name), 4, 44)
         # display.text("RA: %0.0f°" % (moon_ra), 4, 64)
         # display.text("Dec: %0.0f°" % (moon_dec), 4, 84)
-        display.text(RISE_SET[0], 4, 64)
-        display.text(RISE_SET[1], 4, 84)
+        rise_set = locale("common")["rise_set"]
+        display.text(rise_set[0], 4, 64)
+        display.text(rise_set[1], 4, 84)
 
-        display.text(moon_rise_hm, display.measure_text(RISE_SET[0]) + 10, 64)
-        display.text(moon_set_hm, display.measure_text(RISE_SET[1]) + 10, 84)
+        display.text(moon_rise_hm, display.measure_text(rise_set[0]) + 10, 64)
+        display.text(moon_set_hm, display.measure_text(rise_set[1]) + 10, 84)
 
     print_exit("...Moon info display completed")
     return
@@ -472,8 +743,24 @@ def draw_moon_tab():
 
 #----- General display
 
-def draw_astro_tab():
-    '''Displays astro information tabs'''
+def astro_content(t):
+    '''Returns the data and strings shown on tab t'''
+
+    if t == 0:
+        return (current["wd"], current["date_dm"], ephem_ok and
+                [(ephem_data[body]['rise'], ephem_data[body]['set']) for body in body_list])
+    if t == 1:
+        return (current["wd"], current["date_dm"], current["time_hm"], iss_ok and (lat_iss, long_iss, iss_track))
+    return (current["wd"], current["date_dm"], current["time_hm"], moon_ok and
+            (moon_phase, moon_phase1, moon_rise_hm, moon_set_hm))
+
+
+def draw_astro_tab(t):
+    '''Displays astro information tab t, returns the tab displayed'''
+
+    global tab
+
+    tab = t
 
     print_entry("Astro info display tab %s..." % (tab))
 
@@ -488,71 +775,35 @@ def draw_astro_tab():
         draw_moon_tab()
 
     display_tab_status(display, tab, TAB_NB)
-    display.update()
+    display_update(display, frame_hash("astro", tab, astro_content(tab)))
 
     print_exit("...Astro info display completed")
-    return
+    return tab
 
 
 #-------------------------------------------------
 #        Main
 #-------------------------------------------------
 
-def astro():
-    '''Main loop to displays astro tabs according to the key pressed'''
+def wait_astro(t):
+    '''Waits for a key pressed'''
 
-    global tab
+    # Call halt in a loop, on battery this switches off power.
+    # On USB, the app will exit when A+C is pressed because the launcher picks that up.
+    # The ISS tab stays awake in live mode until a button is pressed, halting after ISS_LIVE_AWAKE seconds.
+    if not (t == 1 and iss_ok and ISS_LIVE_PERIOD and iss_live()):
+        stats_halt(display)
+    return None
 
-    changed = False
-    renew = True
-
-
-    while True:
-
-        if renew:
-            print_entry("Collecting astro data...")
-            get_astro_data()
-            renew = False
-            changed = True
-            print_exit("...astro data collected")
-
-        if changed:
-            print_entry("Displaying astro data...")
-            draw_astro_tab()
-            changed = False
-            print_exit("...astro data displayed")
-            print_entry("Waiting for key pressed...")
-
-        # Call halt in a loop, on battery this switches off power.
-        # On USB, the app will exit when A+C is pressed because the launcher picks that up.
-        display.halt()
-
-        if display.pressed(badger2040.BUTTON_DOWN):
-            print_exit("...Button down detected")
-            tab += 1
-            tab = tab % TAB_NB
-            changed = True
-
-        if display.pressed(badger2040.BUTTON_UP):
-            print_exit("...Button up detected")
-            tab -= 1
-            tab = tab % TAB_NB
-            changed = True
-        
-        if display.pressed(badger2040.BUTTON_A):
-            print_exit("...Button ASTRO detected")
-            renew = True
-            changed = True
-        
-        if display.pressed(badger2040.BUTTON_B):
-            print_exit("...Button WEATHER detected")
-            launch_pages("weather")
 
-        if display.pressed(badger2040.BUTTON_C):
-            print_exit("...Button DATA detected")
-            launch_pages("data")
-            
-        # sleep(0.5)
+def astro():
+    '''Main loop to displays astro tabs according to the key pressed, while astro data is fetched in background'''
+
+    global current
+
+    current = current_strings()
+    run_page(display, "astro", tab, TAB_NB, get_astro_data, draw_astro_tab, wait_astro)
+    return
 
 
 # Start of the script 
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                bench_badger.py                    #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Micro-benchmark of the helpers of calc_badger.py against the floating point bytecode versions they replace
+Run it from the REPL on the Badger 2040 (import bench_badger): for each helper, prints the time per call of both
+versions and the number of results differing over the inputs tested
+
+"""
+
+from time import ticks_us, ticks_diff
+
+from calc_badger import bearing_index, utc_hour, hm_convert, day_x, map_x, map_y
+
+
+BENCH_NB = 1000     # Calls timed per helper and version
+
+dirs = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+FORECAST_HOURS = ('09', '12', '18')
+FORECAST_HOURS_NB = (9, 12, 18)
+TIMEZONE = 2
+
+
+#-------------------------------------------------
+#        Former versions
+#-------------------------------------------------
+
+def calculate_bearing_float(d):
+    ix = round(d / (360. / len(dirs)))
+    return dirs[ix % len(dirs)]
+
+
+def forecast_hour_float(utc):
+    hr = '{:02d}'.format(utc // 3600 % 24)
+    return hr in FORECAST_HOURS
+
+
+def hm_local_convert_str(hm):
+    hm_split = hm.split(':')
+    try:
+        h = (int(hm_split[0]) + TIMEZONE) % 24
+        m = int(hm_split[1])
+    except:
+        h = 0
+        m = 0
+    return h, m, "{:02d}:{:02d}".format(h, m)
+
+
+def visi_float(h, m, d):
+    return int((h + m / 60) * d / 24)
+
+
+def map_xy_float(lat, lon):
+    x = (int)(0.49 * lon + 87.5) % 175
+    y = (int)(-0.67 * lat + 60)
+    return x, y
+
+
+#-------------------------------------------------
+#        New versions, called as the pages do
+#-------------------------------------------------
+
+def calculate_bearing_native(d):
+    return dirs[bearing_index(int(d * len(dirs)), len(dirs))]
+
+
+def forecast_hour_native(utc):
+    return utc_hour(utc) in FORECAST_HOURS_NB
+
+
+def hm_local_convert_native(minutes):
+    return hm_convert(minutes, TIMEZONE)
+
+
+def map_xy_fixed(lat, lon):
+    return map_x(round(lon * 100)), map_y(round(lat * 100))
+
+
+#-------------------------------------------------
+#        Benchmark
+#-------------------------------------------------
+
+def bench(name, old, new, inputs, new_inputs=None):
+    '''Times BENCH_NB calls of old over inputs and of new over new_inputs (inputs if None), counts the results differing'''
+
+    if new_inputs is None:
+        new_inputs = inputs
+    n = len(inputs)
+    t0 = ticks_us()
+    for i in range(BENCH_NB):
+        old(*inputs[i % n])
+    t_old = ticks_diff(ticks_us(), t0)
+    t0 = ticks_us()
+    for i in range(BENCH_NB):
+        new(*new_inputs[i % n])
+    t_new = ticks_diff(ticks_us(), t0)
+    diff = len([i for i in range(n) if old(*inputs[i]) != new(*new_inputs[i])])
+    print("%s: %0.1f us -> %0.1f us per call (x%0.1f), %s/%s results differ" %
+          (name, t_old / BENCH_NB, t_new / BENCH_NB, t_old / max(t_new, 1), diff, n))
+    return
+
+
+def bench_all():
+    '''Benchmarks all the helpers'''
+
+    bench("calculate_bearing", calculate_bearing_float, calculate_bearing_native,
+          [(d,) for d in range(0, 360, 7)])
+    bench("forecast hours", forecast_hour_float, forecast_hour_native,
+          [(1686528000 + h * 3600,) for h in range(48)])
+    hms = [(h, m) for h in range(0, 24, 5) for m in range(0, 60, 13)]
+    # Times are parsed once when the ephemeris is read, instead of at each conversion
+    bench("hm_local_convert", hm_local_convert_str, hm_local_convert_native,
+          [("%02d:%02d:12" % hm,) for hm in hms], [(h * 60 + m,) for h, m in hms])
+    bench("visibility bar", visi_float, day_x,
+          [(h, m, 150) for h, m in hms])
+    bench("mapLatLongToXY", map_xy_float, map_xy_fixed,
+          [(lat / 10, lon / 10) for lat in range(-516, 517, 43) for lon in range(-1800, 1800, 97)])
+    return
+
+
+bench_all()
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
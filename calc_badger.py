@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                calc_badger.py                     #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Helpers of the Badger 2040 called on every parse or draw, with no side effect so that any page (and the benchmark,
+bench_badger.py) can import them:
+- integer or fixed-point arithmetic only, the RP2040 having no floating point unit
+- compiled to machine code by the native emitter, or the viper emitter when the helper only handles small integers
+  (no division: the Cortex-M0+ has none, viper would not save the call to the runtime) or bytes of a buffer
+  (raw pointer access, with no slice or copy allocated)
+
+"""
+
+import micropython
+from micropython import const
+
+
+MINUTES_DAY = const(1440)
+SECONDS_HOUR = const(3600)
+
+# Map of the ISS tab (175 x 120 pixels): x = 0.49 * longitude + 87.5, y = -0.67 * latitude + 60, in Q20 fixed point
+# per hundredth of a degree
+MAP_W = const(175)
+MAP_X_SCALE = const(5138)       # 0.0049 * 2**20
+MAP_X_OFFSET = const(91750400)  # 87.5 * 2**20
+MAP_Y_SCALE = const(7025)       # 0.0067 * 2**20
+MAP_Y_OFFSET = const(62914560)  # 60 * 2**20
+
+
+#-------------------------------------------------
+#        Weather helpers
+#-------------------------------------------------
+
+@micropython.native
+def bearing_index(dn, n):
+    '''Returns the index of the nearest of n compass directions, from the wind direction in degrees times n'''
+
+    return (dn + 180) // 360 % n
+
+
+@micropython.native
+def utc_hour(utc):
+    '''Returns the hour (UT) of the timestamp utc'''
+
+    return utc // SECONDS_HOUR % 24
+
+
+#-------------------------------------------------
+#        Astro helpers
+#-------------------------------------------------
+
+@micropython.native
+def hm_convert(minutes, timezone):
+    '''Converts UT minutes of the day (None if missing) into local time (timezone in hours) and its string'''
+
+    if minutes is None:
+        h = 0
+        m = 0
+    else:
+        h = (minutes // 60 + timezone) % 24
+        m = minutes % 60
+    return h, m, "{:02d}:{:02d}".format(h, m)
+
+
+@micropython.native
+def day_x(h, m, d):
+    '''Returns the position of the time h:m on a day d pixels wide'''
+
+    return (h * 60 + m) * d // MINUTES_DAY
+
+
+@micropython.viper
+def map_x(lon_c: int) -> int:
+    '''Returns the x position on the map of the longitude in hundredths of a degree'''
+
+    x = (lon_c * MAP_X_SCALE + MAP_X_OFFSET) >> 20
+    if x < 0:
+        return 0
+    if x >= MAP_W:
+        return x - MAP_W
+    return x
+
+
+@micropython.viper
+def map_y(lat_c: int) -> int:
+    '''Returns the y position on the map of the latitude in hundredths of a degree'''
+
+    return (MAP_Y_OFFSET - lat_c * MAP_Y_SCALE) >> 20
+
+
+#-------------------------------------------------
+#        Buffer helpers
+#-------------------------------------------------
+
+@micropython.viper
+def find_byte(buf: ptr8, start: int, end: int, b: int) -> int:
+    '''Returns the index of the first byte b of buf between start and end, -1 if none'''
+
+    i = start
+    while i < end:
+        if buf[i] == b:
+            return i
+        i += 1
+    return -1
+
+
+@micropython.viper
+def copy_bytes(dst: ptr8, d: int, src: ptr8, s: int, n: int):
+    '''Copies n bytes of src from s to dst from d, first byte first (overlapping buffers if d <= s)'''
+
+    i = 0
+    while i < n:
+        dst[d + i] = src[s + i]
+        i += 1
+
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                clock_badger.py                    #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Clock service shared by all the pages of the Badger 2040 :
+- syncs the RTC with NTP only when its estimated drift exceeds DRIFT_MAX
+- keeps the last sync time and the measured drift rate on flash
+- provides cached local date and time strings
+
+"""
+
+import machine
+import ntptime
+import badger_os
+import badger2040w as badger2040
+from time import gmtime, localtime, time
+
+from common_badger import *
+
+
+DRIFT_MAX = 20              # Max estimated RTC error (s) before syncing again with NTP
+DRIFT_DEFAULT = 0.0001      # Drift rate (s/s) assumed until one has been measured
+DRIFT_SPAN = 3600           # Min time (s) between two syncs to measure the drift rate
+SYNC_MAX = 7 * 86400        # Syncs at least once a week whatever the drift rate
+RTC_YEAR_MIN = 2023         # An RTC set before this year has never been synced
+
+clock_state = {
+    "last_sync": 0,
+    "drift": DRIFT_DEFAULT
+}
+badger_os.state_load("clock", clock_state)
+
+clock_strings = {}
+clock_minute = -1
+
+
+#-------------------------------------------------
+#        RTC functions
+#-------------------------------------------------
+
+def clock_error():
+    '''Estimates the current RTC error (s), None if the RTC must be synced anyway'''
+
+    last_sync = clock_state["last_sync"]
+    if not last_sync or localtime()[0] < RTC_YEAR_MIN:
+        return None
+    elapsed = time() - last_sync
+    if elapsed < 0 or elapsed > SYNC_MAX:
+        return None
+    return clock_state["drift"] * elapsed
+
+
+def set_rtc(t):
+    '''Sets the Pico RTC (and the Badger RTC that keeps time while powered off) to t'''
+
+    tm = gmtime(t)
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+    try:
+        badger2040.pico_rtc_to_pcf()
+    except Exception as e:
+        print_debug("Cannot set Badger RTC: %s" % (e))
+    return
+
+
+def sync_clock(display, force=False):
+    '''Syncs the RTC with NTP if its estimated error exceeds DRIFT_MAX'''
+
+    global clock_minute
+
+    error = clock_error()
+    if not force and error is not None and error < DRIFT_MAX:
+        print_debug("Clock error estimated to %0.1fs, no sync needed" % (error))
+        return True
+
+    print_entry("Syncing clock with NTP...")
+    t_ntp = 0
+    for i in range(TRY_NB):
+        try:
+            t_ntp = ntptime.time()
+            break
+        except Exception:
+            print_debug("Attempt %s to connect" % (i))
+            wifi_connect(display)
+    if not t_ntp:
+        print_error("...error syncing clock")
+        return False
+
+    # Drift rate measured from the offset found since last sync (NTP resolution is 1s)
+    t_rtc = time()
+    span = t_rtc - clock_state["last_sync"]
+    if clock_state["last_sync"] and localtime()[0] >= RTC_YEAR_MIN and DRIFT_SPAN < span < SYNC_MAX:
+        clock_state["drift"] = max(abs(t_ntp - t_rtc), 1) / span
+
+    set_rtc(t_ntp)
+    clock_state["last_sync"] = t_ntp
+    with io_lock:
+        badger_os.state_save("clock", clock_state)
+    clock_minute = -1
+
+    print_exit("...clock synced, offset = %ss, drift = %0.1fppm" %
+               (t_ntp - t_rtc, clock_state["drift"] * 1000000))
+    return True
+
+
+#-------------------------------------------------
+#        Local time functions
+#-------------------------------------------------
+
+def local_time(utc=None):
+    '''Returns the local time tuple of the UT timestamp utc (default: now)'''
+
+    if utc is None:
+        utc = time()
+    return localtime(utc + TIMEZONE * 3600)
+
+
+def current_strings():
+    '''Returns the current date and time strings, cached until the minute changes'''
+
+    global clock_strings, clock_minute
+
+    t = time()
+    if t // 60 == clock_minute:
+        return clock_strings
+
+    dt = localtime(t)
+    dt1 = localtime(t + 86400)
+    lt = local_time(t)
+    clock_strings = {
+        "date_ymd": "%s-%s-%s" % (dt[0], dt[1], dt[2]),
+        "date_ymd1": "%s-%s-%s" % (dt1[0], dt1[1], dt1[2]),
+        "date_dm": "%s/%s" % (lt[2], lt[1]),
+        "time_hm": '{:02d}:{:02d}'.format(lt[3], lt[4]),
+        "wd": locale("common")["weekdays"][lt[6]]
+    }
+    clock_minute = t // 60
+    return clock_strings
+
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
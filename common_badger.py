@@ -11,12 +11,40 @@
 """
 Common functions and data for the Python script to grab data and displays them on Badger 2040 
 Set LAT, LONG, LOCATION, COUNTRY and TIMEZONE 
+Set LOCATIONS for the weather of other locations
+Set PI_HOST, PI_PORT and PUSH_PORT of the local Pi serving local data
+Set THIN_CLIENT and FRAME_PORT to display the tabs pre-rendered by the local Pi
+Set DUAL_CORE to draw the tabs on the second core (filesystem and display accesses then hold io_lock)
+Fetches and JPEG decodes use the buffers of the arena, allocated once at startup
+Set CACHE_TTL to keep the prefetched data longer
+Set COMPRESS to request the responses compressed (gzip or deflate), decompressed on the fly
+Set DNS_TTL to keep the addresses of the hosts resolved longer
 
 """
 
 import urequests
+import asyncio
+import socket
+import errno
+import network
+import json
+import ssl
+import ubinascii
 import badger_os
 import gc
+import io
+import _thread
+from time import time
+
+try:
+    import deflate
+except ImportError:
+    deflate = None      # Firmware older than 1.21: responses are requested uncompressed
+
+from stats_badger import stats_request, stats_update, stats_skip, stats_https, stats_wifi
+from store_badger import store_put, store_get, store_time, store_delete, store_keys, io_lock
+from calc_badger import find_byte, copy_bytes
+from mem_badger import mem_register, mem_update, mem_add, mem_check, MEM_HIGH, MEM_CACHE, MEM_BUFFER
 
 VERBOSE = False
 
@@ -27,24 +55,301 @@ TIMEZONE = 2
 LOCATION = "Paris"
 COUNTRY = "Fr"
 
+# Set the weather locations here: name, country, latitude, longitude and Open Weather Map city id
+# The first one is the home location (weather history and updates pushed by the local Pi)
+LOCATIONS = [
+    (LOCATION, COUNTRY, LAT, LONG, 2988507),
+    # ("Lyon", "Fr", 45.758, 4.835, 2996944),
+]
+
+# Set the address of the local Pi serving local data here
+PI_HOST = "192.168.1.20"
+PI_PORT = 8080
+PUSH_PORT = 8081    # UDP port receiving the updates pushed by the local Pi
+FRAME_PORT = 8082   # Port of the local Pi serving pre-rendered tabs (pi/frame_server.py)
+
+# Thin client mode: astro and weather tabs are pre-rendered by the local Pi
+THIN_CLIENT = False
+THIN_PAGES = ("astro", "weather")
+
+# Dual core mode: data is fetched and parsed on core 0 while tabs are decoded and drawn on core 1 (off by default
+# until run long enough on the badge: the filesystem and the display are shared through io_lock)
+DUAL_CORE = False
+
 TRY_NB = 2
 
+# Data prefetched for the page most likely to be opened next is kept CACHE_TTL seconds in the store (store_badger.py)
+CACHE_TTL = 900
+
+# Addresses of the hosts are kept DNS_TTL seconds in RAM and in the store, then the last good one while resolution fails
+DNS_TTL = 3600
+
+# Responses are requested compressed when the firmware has the deflate module (saves most of the bytes on the air)
+COMPRESS = True
+
 pages = {
     "astro": "astro_badger",
     "weather": "weather_badger",
     "data": "data_badger"
 }
 
-if COUNTRY == 'Fr':
-    WEEKDAYS = ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"]
-    RISE_SET = ["Lever:", "Coucher:"]
-    PAGE_NAMES = ["Astro", "Météo", "Données"]
-    MONTH_NAMES = ["Janv", "Fev", "Mar", "Avr", "Mai", "Juin", "Juil", "Aout", "Sept", "Oct", "Nov", "Dec"]
-else:
-    WEEKDAYS = ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]
-    RISE_SET = ["Rise:", "Set:"]
-    PAGE_NAMES = ["Astro", "Weather", "Data"]
-    MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "June", "July", "Aug", "Sept", "Oct", "Nov", "Dec"]
+# Texts of the active locale, in the resource files of LOCALE_DIR (copied from the locale directory)
+LOCALE = 'fr' if COUNTRY == 'Fr' else 'en'
+LOCALE_DIR = "/locale/"
+
+
+#-------------------------------------------------
+#        Locale functions
+#-------------------------------------------------
+
+locale_tables = {}      # Name: table of the active locale loaded
+
+
+def locale(name):
+    '''Returns the table name of the active locale, loaded from its resource file on first use'''
+
+    table = locale_tables.get(name)
+    if table is None:
+        used = gc.mem_alloc()
+        with io_lock:
+            with open("%s%s_%s.json" % (LOCALE_DIR, name, LOCALE)) as f:
+                table = json.load(f)
+        locale_tables[name] = table
+        mem_add("locale", max(gc.mem_alloc() - used, 0))
+    return table
+
+
+mem_register("locale", MEM_CACHE, 0, locale_tables.clear)
+
+
+#-------------------------------------------------
+#        WiFi
+#-------------------------------------------------
+
+def wifi_connect(display):
+    '''Connects to WiFi if not connected, counting the WiFi on time from now on'''
+
+    if not display.isconnected():
+        # The connection status is drawn on the screen
+        with io_lock:
+            display.connect()
+    stats_wifi()
+    return
+
+
+#-------------------------------------------------
+#        DNS cache
+#-------------------------------------------------
+
+dns_cache = {}          # Host: [address, time resolved]
+DNS_STALE_ERRORS = (errno.ECONNREFUSED, errno.EHOSTUNREACH)     # Connection errors expiring the address cached
+
+
+def dns_key(host):
+    '''Returns the key of the address of host in the store'''
+
+    return "dns_" + host
+
+
+def dns_resolve(host, port):
+    '''Returns the address of host, resolved again once older than DNS_TTL, the last good one if resolution fails'''
+
+    if host.replace('.', '').isdigit():
+        return host
+    entry = dns_cache.get(host)
+    if entry is None:
+        t = store_time(dns_key(host))
+        if t is not None:
+            address = store_get(dns_key(host))
+            if address is not None:
+                entry = dns_cache[host] = [str(address, 'utf-8'), t]
+    if entry is not None and time() - entry[1] <= DNS_TTL:
+        return entry[0]
+
+    try:
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1][0]
+    except OSError as e:
+        if entry is None:
+            raise
+        print_debug("Cannot resolve %s (%s), using %s" % (host, e, entry[0]))
+        return entry[0]
+    print_debug("%s resolved as %s" % (host, address))
+    t = int(time())
+    dns_cache[host] = [address, t]
+    store_put(dns_key(host), address.encode(), t=t)
+    return address
+
+
+def dns_expire(host):
+    '''Resolves host again on the next connection, its address having refused the connection (kept if resolution fails)'''
+
+    if host in dns_cache:
+        dns_cache[host][1] = 0
+    return
+
+
+def dns_url(url):
+    '''Returns url with its host replaced by its address, and the headers naming the host
+    (plain HTTP only: the name of an HTTPS host is needed for the TLS handshake)'''
+
+    proto, _, host, path = url.split('/', 3)
+    if proto != 'http:':
+        return url, {}
+    name, _, port = host.partition(':')
+    address = dns_resolve(name, int(port) if port else 80)
+    return "http://%s%s/%s" % (address, ':' + port if port else '', path), {"Host": host}
+
+
+#-------------------------------------------------
+#        Buffer arena
+#-------------------------------------------------
+
+HTTP_BUF_SIZE = 32768   # Largest response body read in place (One Call response is about 25 kB)
+JPEG_BUF_SIZE = 9216    # Largest JPEG file read in place (world map)
+GZIP_BUF_SIZE = 8192    # Largest compressed body read in place before being decompressed (One Call is about 5 kB)
+LINE_MAX = 128          # Longest line of a text body parsed line by line, longer ones are skipped (and size of the chunks read)
+DEFLATE_RATIO = 5       # Size of a decompressed json body over its compressed size, estimated (One Call 25 kB / 5 kB)
+
+COMPRESSED = COMPRESS and deflate is not None
+ENCODINGS = {
+    b'gzip': deflate and deflate.GZIP,
+    b'deflate': deflate and deflate.ZLIB
+}
+
+# Buffers allocated once at startup, before the heap gets fragmented, and reused by every fetch and decode:
+# a view on the http buffer is only valid until the next fetch, the jpeg buffer until the next jpeg_open
+arena = {
+    "http": bytearray(HTTP_BUF_SIZE),
+    "jpeg": bytearray(JPEG_BUF_SIZE),
+    "gzip": bytearray(GZIP_BUF_SIZE if COMPRESSED else 0),
+    "line": bytearray(2 * LINE_MAX)     # Line started in the previous chunk (right aligned), then the chunk read
+}
+mem_register("arena", MEM_BUFFER, sum([len(buf) for buf in arena.values()]))
+line_view = memoryview(arena["line"])
+chunk_view = line_view[LINE_MAX:]
+
+
+class BodyReader(io.IOBase):
+    '''Stream on a view on a body, read with no copy of the body by the consumers of streams (DeflateIO, read_lines)'''
+
+    def __init__(self, body):
+        self.body = body
+        self.pos = 0
+
+    def readinto(self, buf):
+        n = min(len(buf), len(self.body) - self.pos)
+        copy_bytes(buf, 0, self.body, self.pos, n)
+        self.pos += n
+        return n
+
+
+def body_stream(stream, encoding):
+    '''Returns a stream on the body read from stream, decompressed on the fly if compressed with encoding'''
+
+    if encoding in ENCODINGS:
+        return deflate.DeflateIO(stream, ENCODINGS[encoding])
+    return stream
+
+
+def read_body(stream, buf):
+    '''Reads stream until EOF into buf, returns a view on the data read (None if buf is full)'''
+
+    mv = memoryview(buf)
+    n = 0
+    while n < len(buf):
+        k = stream.readinto(mv[n:])
+        if not k:
+            return mv[:n]
+        n += k
+    return None
+
+
+async def aread_body(reader, buf):
+    '''Reads reader until EOF into buf without blocking the event loop, returns a view on the data read (None if buf is full)'''
+
+    mv = memoryview(buf)
+    n = 0
+    while n < len(buf):
+        k = await reader.readinto(mv[n:])
+        if not k:
+            return mv[:n]
+        n += k
+    return None
+
+
+def read_all(stream, buf):
+    '''Reads stream until EOF into buf, returns a view on the data read, raises ValueError if larger than buf
+    (never copied into the heap)'''
+
+    body = read_body(stream, buf)
+    if body is None:
+        raise ValueError("Body larger than %s bytes" % (len(buf)))
+    return body
+
+
+def read_lines(stream, parse):
+    '''Passes each line read from stream to parse, as a view on the line buffer of the arena valid during the call only,
+    until parse returns True, returns whether it did: chunks are read into the arena, lines are split in place, and
+    only the end of a line cut by a chunk is moved (before the next chunk)'''
+
+    buf = arena["line"]
+    m = 0           # Length of the line started in the previous chunk, kept right before the chunk
+    skip = False    # Line longer than LINE_MAX being skipped up to its end
+    while True:
+        k = stream.readinto(chunk_view)
+        if not k:
+            # Last line, with no line feed
+            return m > 0 and parse(line_view[LINE_MAX - m:LINE_MAX])
+        end_chunk = LINE_MAX + k
+        start = LINE_MAX - m
+        end = find_byte(buf, LINE_MAX, end_chunk, 10)
+        while end >= 0:
+            if not skip and end - start <= LINE_MAX and parse(line_view[start:end]):
+                return True
+            skip = False
+            start = end + 1
+            end = find_byte(buf, start, end_chunk, 10)
+        m = end_chunk - start
+        if skip or m > LINE_MAX:
+            skip = True
+            m = 0
+        else:
+            copy_bytes(buf, LINE_MAX - m, buf, start, m)
+
+
+def fetch_open(url):
+    '''Fetches url, returns the response and a stream on its body, decompressed on the fly as it is received'''
+
+    address_url, headers = dns_url(url)
+    if COMPRESSED:
+        headers["Accept-Encoding"] = "gzip, deflate"
+    r = urequests.get(address_url, headers=headers)
+    headers = dict([(name.lower(), value) for name, value in r.headers.items()])
+    stats_request(url, int(headers.get("content-length", 0)))
+    return r, body_stream(r.raw, headers.get("content-encoding", "").lower().encode())
+
+
+def fetch_body(url):
+    '''Fetches url, returns a view on the body read (and decompressed) into the http buffer'''
+
+    r, stream = fetch_open(url)
+    try:
+        return read_all(stream, arena["http"])
+    finally:
+        r.close()
+
+
+def jpeg_open(jpeg, path):
+    '''Opens the JPEG file path for decoding, from the jpeg buffer when it fits'''
+
+    with io_lock:
+        with open(path, 'rb') as f:
+            n = f.readinto(arena["jpeg"])
+    if n < JPEG_BUF_SIZE:
+        jpeg.open_RAM(memoryview(arena["jpeg"])[:n])
+    else:
+        jpeg.open_file(path)
+    return
 
 
 #-------------------------------------------------
@@ -58,14 +363,12 @@ def fetch_data_text(display, url):
     print_entry("Fetching text data from web...")
     for i in range(TRY_NB):
         try:
-            r = urequests.get(url)
-            txt = r.text
-            r.close()
+            txt = str(fetch_body(url), 'utf-8')
             print_exit("...fetching OK")
             return txt
         except Exception as e:
             print_debug("Attempt %s to connect" % (i))
-            display.connect()
+            wifi_connect(display)
     print_error("...error fetching data")
     return ''
 
@@ -75,14 +378,380 @@ def fetch_data_json(display, url):
     print_entry("Fetching json data from web...")
     for i in range(TRY_NB):
         try:
-            r = urequests.get(url)
-            j = r.json()
-            r.close()
+            # Parsed from the socket as it is received and decompressed: the body is never held
+            r, stream = fetch_open(url)
+            try:
+                j = json.load(stream)
+            finally:
+                r.close()
             print_exit("...fetching OK")
             return j
         except Exception as e:
             print_debug("Attempt %s to connect" % (i))
-            display.connect()
+            wifi_connect(display)
+    print_error("...error fetching data")
+    return {}
+
+
+#-------------------------------------------------
+#        Kept alive connections
+#-------------------------------------------------
+
+connections = {}            # Host: (reader, writer) of the HTTPS connection kept alive
+TLS_CONN_SIZE = 20480       # Heap held by a TLS connection (mbedTLS buffers and context), estimated
+
+
+class TLSContext:
+    '''SSL context passed to asyncio.open_connection, naming the host in the handshake while connected to its address'''
+
+    def __init__(self, host):
+        self.host = host
+        self.ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        self.ctx.verify_mode = ssl.CERT_NONE
+
+    def wrap_socket(self, sock, server_hostname=None, do_handshake_on_connect=True):
+        return self.ctx.wrap_socket(sock, server_hostname=self.host, do_handshake_on_connect=do_handshake_on_connect)
+
+
+async def aread_exactly(reader, mv):
+    '''Reads exactly len(mv) bytes into mv without blocking the event loop'''
+
+    n = 0
+    while n < len(mv):
+        k = await reader.readinto(mv[n:])
+        if not k:
+            raise OSError("connection closed")
+        n += k
+    return
+
+
+async def aread_response(reader, buf):
+    '''Reads a response, returns the status, a view on the body read into buf (into the gzip buffer if compressed), its
+    content encoding and whether the connection can be kept alive'''
+
+    line = await reader.readline()
+    if not line:
+        raise OSError("connection closed")
+    status = int(line.split()[1])
+    keep = line.startswith(b'HTTP/1.1')
+    length = None
+    chunked = False
+    encoding = b''
+    while True:
+        line = await reader.readline()
+        if not line or line == b'\r\n':
+            break
+        header = line.split(b':', 1)
+        if len(header) < 2:
+            continue
+        name = header[0].strip().lower()
+        value = header[1].strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = value == b'chunked'
+        elif name == b'connection':
+            keep = value == b'keep-alive'
+        elif name == b'content-encoding':
+            encoding = value
+
+    if encoding in ENCODINGS:
+        # Compressed body kept in the gzip buffer, decompressed on the fly by its consumer (see body_stream)
+        buf = arena["gzip"]
+    else:
+        encoding = b''
+    body = await aread_body_framed(reader, buf, length, chunked)
+    return status, body, encoding, keep and (chunked or length is not None)
+
+
+async def aread_body_framed(reader, buf, length, chunked):
+    '''Reads the body of a response, chunked, of length bytes or until EOF, returns a view on the body read into buf'''
+
+    mv = memoryview(buf)
+    if chunked:
+        n = 0
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if not size:
+                while (await reader.readline()) not in (b'\r\n', b''):
+                    pass
+                break
+            if n + size > len(buf):
+                # Larger than the arena: falls back to a heap allocated body
+                print_debug("Body larger than %s bytes" % (len(buf)))
+                grown = bytearray(n + size)
+                grown[:n] = mv[:n]
+                buf = grown
+                mv = memoryview(buf)
+            await aread_exactly(reader, mv[n:n + size])
+            n += size
+            await reader.readline()
+        return mv[:n]
+    if length is not None:
+        if length > len(buf):
+            print_debug("Body larger than %s bytes" % (len(buf)))
+            mv = memoryview(bytearray(length))
+        await aread_exactly(reader, mv[:length])
+        return mv[:length]
+    body = await aread_body(reader, buf)
+    if body is None:
+        print_debug("Body larger than %s bytes" % (len(buf)))
+        body = buf + await reader.read(-1)
+    return body
+
+
+async def aclose(conn):
+    '''Closes the connection conn'''
+
+    try:
+        conn[1].close()
+        await conn[1].wait_closed()
+    except Exception:
+        pass
+    return
+
+
+async def aclose_all():
+    '''Closes the connections kept alive'''
+
+    while connections:
+        await aclose(connections.popitem()[1])
+    mem_update("tls", 0)
+    return
+
+
+def tls_evict():
+    '''Closes the connections kept alive to free their heap, from outside the event loop'''
+
+    while connections:
+        try:
+            connections.popitem()[1][1].close()
+        except Exception:
+            pass
+    return
+
+
+mem_register("tls", MEM_CACHE, 0, tls_evict)
+
+
+async def afetch(url):
+    '''Fetches url without blocking the event loop, returns the status, a view on the body read into the http buffer
+    (into the gzip buffer if compressed) and its content encoding (b'' if not compressed)
+    HTTPS connections are kept alive (HTTP/1.1) for the next request to the same host, saving its TLS handshake
+    (the ssl module of MicroPython cannot resume TLS sessions: each new connection makes a full handshake)'''
+
+    proto, _, host, path = url.split('/', 3)
+    https = proto == 'https:'
+    port = 443 if https else 80
+    if ':' in host:
+        host, port = host.split(':')
+        port = int(port)
+    request = ("GET /%s HTTP/1.1\r\nHost: %s\r\nConnection: keep-alive\r\n" if https else
+               "GET /%s HTTP/1.0\r\nHost: %s\r\n") % (path, host)
+    request += "Accept-Encoding: gzip, deflate\r\n\r\n" if COMPRESSED else "\r\n"
+
+    # Connection kept alive from a previous request, if the server did not close it meanwhile
+    conn = connections.pop(host, None)
+    if conn is not None:
+        try:
+            conn[1].write(request.encode())
+            await conn[1].drain()
+            status, body, encoding, keep = await aread_response(conn[0], arena["http"])
+            print_debug("TLS connection to %s kept alive" % (host))
+            stats_https("kept")
+        except OSError:
+            await aclose(conn)
+            conn = None
+        except:
+            await aclose(conn)
+            raise
+
+    if conn is None:
+        mem_check(TLS_CONN_SIZE if https else 0)
+        try:
+            conn = await asyncio.open_connection(dns_resolve(host, port), port, ssl=TLSContext(host) if https else None)
+        except OSError as e:
+            # Address refused while the network is up: maybe no longer valid, resolved again on the next attempt
+            # (kept when WiFi is down or the connection timed out)
+            if e.errno in DNS_STALE_ERRORS and network.WLAN(network.STA_IF).isconnected():
+                dns_expire(host)
+            raise
+        try:
+            conn[1].write(request.encode())
+            await conn[1].drain()
+            status, body, encoding, keep = await aread_response(conn[0], arena["http"])
+            if https:
+                print_debug("TLS connection to %s opened" % (host))
+                stats_https("opened")
+        except:
+            await aclose(conn)
+            raise
+
+    if keep and https:
+        connections[host] = conn
+    else:
+        await aclose(conn)
+    mem_update("tls", len(connections) * TLS_CONN_SIZE)
+    stats_request(url, len(body))
+    return status, body, encoding
+
+
+#-------------------------------------------------
+#        Cache of prefetched data
+#-------------------------------------------------
+
+cache_state = {
+    "use": True         # False when the page is refreshed by the user: data is fetched again
+}
+
+
+def cache_key(key):
+    '''Returns the key of the cache entry key in the store'''
+
+    return "cache_" + key
+
+
+def cache_put(key, body):
+    '''Stores body in the cache entry key'''
+
+    store_put(cache_key(key), body)
+    return
+
+
+def cache_get(key):
+    '''Returns a view on the body of the cache entry key read into the http buffer, None if missing or older than CACHE_TTL'''
+
+    if not cache_fresh(key):
+        cache_remove(key)
+        return None
+    return store_get(cache_key(key), arena["http"])
+
+
+def cache_fresh(key):
+    '''Returns whether the cache entry key is younger than CACHE_TTL'''
+
+    t = store_time(cache_key(key))
+    return t is not None and time() - t <= CACHE_TTL
+
+
+def cache_remove(key):
+    '''Removes the cache entry key'''
+
+    store_delete(cache_key(key))
+    return
+
+
+def cache_clean():
+    '''Removes the cache entries older than CACHE_TTL'''
+
+    for key in store_keys(cache_key('')):
+        if time() - store_time(key) > CACHE_TTL:
+            store_delete(key)
+    return
+
+
+def cache_read(key):
+    '''Returns a view on the body of the cache entry key when the page may use the cache, None otherwise'''
+
+    if key is None or not cache_state["use"]:
+        return None
+    body = cache_get(key)
+    if body is not None:
+        print_debug("Data %s read from the cache" % (key))
+    return body
+
+
+async def afetch_data_text(display, url, key=None):
+    '''Fetches data as text without blocking the event loop, from the cache entry key if prefetched'''
+
+    print_entry("Fetching text data from web...")
+    body = cache_read(key)
+    if body is not None:
+        mem_check(len(body))
+        print_exit("...fetching OK")
+        return str(body, 'utf-8')
+    for i in range(TRY_NB):
+        try:
+            status, body, encoding = await afetch(url)
+            if encoding:
+                body = read_all(body_stream(BodyReader(body), encoding), arena["http"])
+            mem_check(len(body))
+            print_exit("...fetching OK")
+            return str(body, 'utf-8')
+        except asyncio.CancelledError:
+            print_error("...fetching cancelled")
+            raise
+        except MemoryError:
+            print_error("...out of memory, evicting caches")
+            mem_check(MEM_HIGH)
+        except Exception as e:
+            print_debug("Attempt %s to connect" % (i))
+            wifi_connect(display)
+    print_error("...error fetching data")
+    return ''
+
+
+async def afetch_data_lines(display, url, parse, key=None):
+    '''Fetches data as text without blocking the event loop, from the cache entry key if prefetched, passing each line to
+    parse until it returns True (see read_lines), returns whether data was fetched'''
+
+    print_entry("Fetching text lines from web...")
+    body = cache_read(key)
+    if body is not None:
+        read_lines(BodyReader(body), parse)
+        print_exit("...fetching OK")
+        return True
+    for i in range(TRY_NB):
+        try:
+            status, body, encoding = await afetch(url)
+            # Lines decompressed and parsed one at a time: the decompressed body is never held
+            if read_lines(body_stream(BodyReader(body), encoding), parse):
+                print_debug("Parsing stopped before the end of the body")
+            print_exit("...fetching OK")
+            return True
+        except asyncio.CancelledError:
+            print_error("...fetching cancelled")
+            raise
+        except MemoryError:
+            print_error("...out of memory, evicting caches")
+            mem_check(MEM_HIGH)
+        except Exception as e:
+            print_debug("Attempt %s to connect" % (i))
+            wifi_connect(display)
+    print_error("...error fetching data")
+    return False
+
+
+async def afetch_data_json(display, url, key=None):
+    '''Fetches data as json without blocking the event loop, from the cache entry key if prefetched'''
+
+    print_entry("Fetching json data from web...")
+    body = cache_read(key)
+    if body is not None:
+        mem_check(len(body))
+        print_exit("...fetching OK")
+        return json.loads(body)
+    for i in range(TRY_NB):
+        try:
+            status, body, encoding = await afetch(url)
+            # Parsed data takes about the size of the body (decompressed)
+            if encoding:
+                mem_check(len(body) * DEFLATE_RATIO)
+                j = json.load(body_stream(BodyReader(body), encoding))
+            else:
+                mem_check(len(body))
+                j = json.loads(body)
+            print_exit("...fetching OK")
+            return j
+        except asyncio.CancelledError:
+            print_error("...fetching cancelled")
+            raise
+        except MemoryError:
+            print_error("...out of memory, evicting caches")
+            mem_check(MEM_HIGH)
+        except Exception as e:
+            print_debug("Attempt %s to connect" % (i))
+            wifi_connect(display)
     print_error("...error fetching data")
     return {}
 
@@ -93,6 +762,9 @@ def fetch_data_json(display, url):
 
 def launch_pages(pages_name):
     file = pages[pages_name]
+    if THIN_CLIENT and pages_name in THIN_PAGES:
+        badger_os.state_save("thin", {"page": pages_name})
+        file = "thin_badger"
     for k in locals().keys():
         if VERBOSE:
             print("process = " + k)
@@ -162,16 +834,78 @@ def underline_text(display, text, x, y, s):
 #        Display functions
 #-------------------------------------------------
 
+LAYOUT_VERSION = 1  # Increase when the layout of the tabs changes, so that the frames already shown are redrawn
+
+# The e-ink panel keeps its image through halt and reboots, so does the hash of the frame it shows
+shown_state = {
+    "hash": 0       # Hash of the content of the frame shown, 0 if unknown
+}
+update_state = {
+    "defer": None,      # Thread of the render stage (core 1) while it draws: its update is run once data_lock is released
+    "pending": None     # Hash of the frame drawn waiting for its update, None if none
+}
+shown = store_get("shown")
+if shown is not None:
+    shown_state["hash"] = int.from_bytes(shown, 'little')
+
+
+def frame_hash(page, t, content):
+    '''Returns the hash of tab t of page drawn from content (the data and strings the tab shows)'''
+
+    return ubinascii.crc32(("%s;%s;%s;%r" % (LAYOUT_VERSION, page, t, content)).encode()) or 1
+
+
+def frame_shown(h):
+    '''Records h as the hash of the frame shown (0 if unknown)'''
+
+    if shown_state["hash"] != h:
+        shown_state["hash"] = h
+        store_put("shown", h.to_bytes(4, 'little'))
+    return
+
+
+def display_update(display, h=0):
+    '''Updates the screen with the frame drawn, of hash h, unless the same frame is already shown; returns True if updated'''
+
+    if h and h == shown_state["hash"]:
+        print_debug("Frame unchanged, update skipped")
+        stats_skip()
+        return False
+    if update_state["defer"] == _thread.get_ident():
+        update_state["pending"] = h
+        return True
+    with io_lock:
+        display.update()
+    stats_update()
+    frame_shown(h)
+    return True
+
+
+def display_flush(display):
+    '''Runs the update left pending by display_update on the render stage, returns the hash of the frame shown
+    (None if no update), to be recorded with frame_shown by core 0 (core 1 does not write to flash)'''
+
+    h = update_state["pending"]
+    if h is None:
+        return None
+    update_state["pending"] = None
+    with io_lock:
+        display.update()
+    stats_update()
+    return h
+
+
 def display_status(display, text):
-    display.set_font("bitmap6")
-    display.set_pen(0)
-    display.rectangle(0, 0, 296, 140)
-    display.set_pen(15)
-    title_string = ">>> %s <<<" % (text)
-    display.text(title_string, 148 -
-                 int(display.measure_text(title_string)/2), 52)
-    display.set_pen(0)
-    display.update()
+    with io_lock:
+        display.set_font("bitmap6")
+        display.set_pen(0)
+        display.rectangle(0, 0, 296, 140)
+        display.set_pen(15)
+        title_string = ">>> %s <<<" % (text)
+        display.text(title_string, 148 -
+                     int(display.measure_text(title_string)/2), 52)
+        display.set_pen(0)
+        display_update(display)
     return
 
 
@@ -208,13 +942,47 @@ def display_menu(display):
     display.set_pen(0)
     display.rectangle(0, 118, 296, 10)
     display.set_pen(15)
-    display.text(PAGE_NAMES[0], 40, 120, 100, 1)
-    display.text(PAGE_NAMES[1], 136, 120, 100, 1)
-    display.text(PAGE_NAMES[2], 242, 120, 100, 1)
+    page_names = locale("common")["pages"]
+    display.text(page_names[0], 40, 120, 100, 1)
+    display.text(page_names[1], 136, 120, 100, 1)
+    display.text(page_names[2], 242, 120, 100, 1)
     display.set_pen(0)
     return
 
 
+def display_partial(display, regions):
+    '''Updates only the regions (x, y, w, h) of the screen, aligned on 8 pixel rows, merging those sharing rows into as
+    few bands as possible (each partial update costs a panel refresh, whatever its size)'''
+
+    boxes = []
+    for x, y, w, h in regions:
+        y0 = y // 8 * 8
+        boxes.append([x, y0, x + w, (y + h + 7) // 8 * 8])
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a = boxes[i]
+                b = boxes[j]
+                if a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    boxes.pop(j)
+                    merged = True
+                    break
+            if merged:
+                break
+
+    for x0, y0, x1, y1 in boxes:
+        print_debug("Partial update of %s, %s, %s, %s" % (x0, y0, x1 - x0, y1 - y0))
+        with io_lock:
+            display.partial_update(x0, y0, x1 - x0, y1 - y0)
+        stats_update(partial=True)
+    frame_shown(0)
+    return
+
+
 def display_clear(display):
     display.set_pen(15)
     display.clear()
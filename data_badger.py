@@ -0,0 +1,326 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                data_badger.py                     #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Python script to grab local data and displays them on Badger 2040 :
+- CO2 level
+- Strava data
+- Temperature from various locations
+- Energy and I/O usage counters of the Badger (see stats_badger.py)
+
+Fetches all info from the local Pi in a single request, as compact text lines (';' separated fields, '#' for comments):
+- C;<ppm>;<utc>                                 CO2 level and time of measure
+- S;<period>;<count>;<km>;<elevation m>;<h:mm>  Strava totals, period W (week), M (month) or Y (year)
+- T;<location>;<temp °C>;<humidity %>           Temperature of a location
+
+While awake, the local Pi can also push the lines that changed (see push_badger.py)
+
+Requires
+- Local Pi to grab info from (see pi/data_server.py for a stand-in server)
+- Locale resource files in /locale/
+- common_badger.py library of common functions and data
+- clock_badger.py clock service
+- push_badger.py listener for pushed updates
+- stats_badger.py usage counters
+- Set PI_HOST, PI_PORT and PUSH_PORT in common_badger.py
+
+"""
+
+import badger2040w as badger2040
+
+from common_badger import *
+from clock_badger import sync_clock, current_strings, local_time
+from sources_badger import data_source
+from stats_badger import stats_halt, stats_lines
+from mem_badger import mem_lines
+from loop_badger import run_page, data_lock
+
+
+CO2_LEVELS = (800, 1200)    # Limits between good, average and bad CO2 levels (ppm)
+CO2_MAX = 2000              # CO2 level at full gauge (ppm)
+STRAVA_PERIODS = ('W', 'M', 'Y')
+
+TAB_NB = 4     # CO2, Strava, temperatures and stats, named in the locale table
+tab = 0  # Let's start with "CO2" tab !
+
+# Display Setup
+
+display = badger2040.Badger2040W()
+display.set_update_speed(2)
+
+
+#-------------------------------------------------
+#        Data functions
+#-------------------------------------------------
+
+co2_data = {
+    'ppm': 0,
+    'utc': 0
+}
+strava_data = {}
+temp_data = []
+data_ok = False
+
+
+def read_data_line(line):
+    '''Parses one data line into the data store, returns the tab showing it (None if not parsed)'''
+
+    global co2_data
+
+    if not line or line[0] == '#':
+        return None
+    fields = line.strip().split(';')
+    try:
+        if fields[0] == 'C':
+            co2_data = {
+                'ppm': int(fields[1]),
+                'utc': int(fields[2])
+            }
+            return 0
+        if fields[0] == 'S':
+            strava_data[fields[1]] = {
+                'count': int(fields[2]),
+                'km': float(fields[3]),
+                'elev': int(fields[4]),
+                'time': fields[5]
+            }
+            return 1
+        if fields[0] == 'T':
+            temp = (fields[1], float(fields[2]), int(fields[3]))
+            for i in range(len(temp_data)):
+                if temp_data[i][0] == temp[0]:
+                    temp_data[i] = temp
+                    break
+            else:
+                temp_data.append(temp)
+            return 2
+    except Exception as e:
+        print_debug("Cannot parse data line %s: %s" % (line, e))
+    return None
+
+
+async def get_data(tab):
+    '''Fetches all the local data from the local Pi in a single request (whatever the tab shown)'''
+
+    global data_ok, temp_data
+
+    print_entry("Getting all local data...")
+    sync_clock(display)
+
+    key, url = data_source()
+    data_text = await afetch_data_text(display, url, key)
+    data_ok = bool(data_text)
+    if data_ok:
+        with data_lock:
+            temp_data = []
+            for line in data_text.split('\n'):
+                read_data_line(line)
+        print_exit("...success getting all local data")
+    else:
+        print_error("...error getting local data")
+    return
+
+
+#-------------------------------------------------
+#        Display functions
+#-------------------------------------------------
+
+def draw_title(t):
+    '''Displays the tab title with the current date and time'''
+
+    current = current_strings()
+    display_title(display, "%s %s, %s %s" % (
+        locale("data")["tabs"][t], LOCATION, current["wd"], current["time_hm"]))
+    return
+
+
+def draw_co2_tab():
+    '''Displays the CO2 level'''
+
+    print_entry("CO2 info display...")
+    draw_title(0)
+    if not co2_data['utc']:
+        print_exit("...no CO2 info to be displayed")
+        return
+
+    ppm = co2_data['ppm']
+    level = 0
+    while level < len(CO2_LEVELS) and ppm >= CO2_LEVELS[level]:
+        level += 1
+
+    display.set_font("bitmap8")
+    display.set_pen(0)
+    display.text("%s ppm" % (ppm), 10, 30, 200, 4)
+    display.text(locale("data")["co2"][level], 190, 36, 90, 2)
+
+    # Gauge with the level limits
+    display.rectangle(10, 70, 266, 14)
+    display.set_pen(15)
+    display.rectangle(11, 71, 264, 12)
+    display.set_pen(0)
+    display.rectangle(11, 71, min(ppm, CO2_MAX) * 264 // CO2_MAX, 12)
+    for limit in CO2_LEVELS:
+        x = 11 + limit * 264 // CO2_MAX
+        display.line(x, 66, x, 88)
+
+    dt = local_time(co2_data['utc'])
+    display.text('{:02d}:{:02d}'.format(dt[3], dt[4]), 10, 96, 100, 2)
+
+    print_exit("...CO2 info display completed")
+    return
+
+
+def draw_strava_tab():
+    '''Displays the Strava totals for each period'''
+
+    print_entry("Strava info display...")
+    draw_title(1)
+
+    display.set_font("bitmap8")
+    display.set_pen(0)
+    y = 28
+    for period in STRAVA_PERIODS:
+        if period not in strava_data:
+            continue
+        strava = strava_data[period]
+        display.text(locale("data")["strava"][period], 4, y, 80, 2)
+        flush_text_right(display, "%s" % (strava['count']), 110, y, 2)
+        flush_text_right(display, "%0.0f km" % (strava['km']), 190, y, 2)
+        flush_text_right(display, "%s m" % (strava['elev']), 270, y, 2)
+        display.text(strava['time'], 120, y + 16, 80, 1)
+        y += 30
+
+    print_exit("...Strava info display completed")
+    return
+
+
+def draw_temp_tab():
+    '''Displays the temperature of each location'''
+
+    print_entry("Temperature info display...")
+    draw_title(2)
+
+    display.set_font("bitmap8")
+    display.set_pen(0)
+    y = 26
+    for location, temp, humidity in temp_data[:5]:
+        display.text(location, 4, y, 150, 2)
+        flush_text_right(display, "%0.1f °C" % (temp), 210, y, 2)
+        flush_text_right(display, "%s %%" % (humidity), 270, y, 2)
+        y += 18
+
+    print_exit("...temperature info display completed")
+    return
+
+
+def stats_tab_lines():
+    '''Returns the lines of the Stats tab: usage counters, with the heap usage after the totals'''
+
+    lines = stats_lines()
+    return (lines[:6] + mem_lines()[:1] + lines[6:])[:8]
+
+
+def draw_stats_tab():
+    '''Displays the usage counters of the Badger'''
+
+    print_entry("Stats display...")
+    draw_title(3)
+
+    display.set_font("bitmap8")
+    display.set_pen(0)
+    y = 24
+    for line in stats_tab_lines():
+        display.text(line, 4, y, 292, 1)
+        y += 11
+
+    print_exit("...stats display completed")
+    return
+
+
+def data_content(t):
+    '''Returns the data and strings shown on tab t'''
+
+    current = current_strings()
+    if t == 3:
+        return (current["wd"], current["time_hm"], stats_tab_lines())
+    return (current["wd"], current["time_hm"], data_ok and (co2_data, strava_data, temp_data)[t])
+
+
+def draw_data_tab(t):
+    '''Displays local data tab t, returns the tab displayed'''
+
+    global tab
+
+    tab = t
+
+    print_entry("Local data display tab %s..." % (tab))
+
+    # Hashed before drawing, so that a minute changing while drawing is never missed
+    h = frame_hash("data", tab, data_content(tab))
+    display_clear(display)
+    display_menu(display)
+
+    if tab == 3:
+        draw_stats_tab()
+    elif not data_ok:
+        display_title(display, locale("data")["tabs"][tab])
+        display.set_pen(0)
+        display.rectangle(0, 60, 296, 25)
+        display.set_pen(15)
+        display.text("Unable to reach local Pi!", 5, 65, 296, 1)
+        display.set_pen(0)
+    elif tab == 0:
+        draw_co2_tab()
+    elif tab == 1:
+        draw_strava_tab()
+    elif tab == 2:
+        draw_temp_tab()
+
+    display_tab_status(display, tab, TAB_NB)
+    display_update(display, h)
+
+    print_exit("...local data display completed")
+    return tab
+
+
+#-------------------------------------------------
+#        Main
+#-------------------------------------------------
+
+def wait_data(t):
+    '''Waits for a key pressed, returns the tabs updated meanwhile'''
+
+    # Listens to the updates pushed by the local Pi while awake (imported once idle only)
+    from push_badger import push_listen
+    dirty = push_listen(display, read_data_line)
+
+    # Call halt in a loop, on battery this switches off power.
+    # On USB, the app will exit when A+C is pressed because the launcher picks that up.
+    if dirty is None:
+        stats_halt(display)
+    return dirty
+
+
+def data():
+    '''Main loop to displays local data tabs according to the key pressed, while local data is fetched in background'''
+
+    run_page(display, "data", tab, TAB_NB, get_data, draw_data_tab, wait_data)
+    return
+
+
+# Start of the script
+print(">> START data <<")
+
+# Launch the loop
+data()
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                history_badger.py                  #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Weather history log of the Badger 2040, kept on flash as a ring file of fixed size records:
+- one slot per HISTORY_STEP seconds, the slot of a sample is given by its time
+- HISTORY_SLOTS slots, so that the file size never exceeds HISTORY_SLOTS * HISTORY_SIZE
+- reading a window of samples is one seek and one read (two when the window wraps around the file end)
+- samples are drawn as sparklines (trends tab of the weather page only, kept out of common_badger.py)
+
+"""
+
+import struct
+
+from common_badger import *
+
+
+HISTORY_FILE = "/weather_history.bin"
+HISTORY_STEP = 1800                 # One slot every 30 minutes...
+HISTORY_SLOTS = 7 * 48              # ...for 7 days
+HISTORY_FMT = "<IhHBB"              # UTC, temp (0.1°C), pressure (0.1hPa), humidity (%), wind (km/h)
+HISTORY_SIZE = struct.calcsize(HISTORY_FMT)
+
+
+#-------------------------------------------------
+#        History file functions
+#-------------------------------------------------
+
+def history_file():
+    '''Opens the history file, creating it empty if missing or of the wrong size'''
+
+    try:
+        f = open(HISTORY_FILE, "r+b")
+        f.seek(0, 2)
+        if f.tell() == HISTORY_SLOTS * HISTORY_SIZE:
+            return f
+        f.close()
+    except OSError:
+        pass
+    print_debug("Creating history file %s" % (HISTORY_FILE))
+    f = open(HISTORY_FILE, "w+b")
+    empty = bytes(HISTORY_SIZE * 48)
+    for i in range(HISTORY_SLOTS // 48):
+        f.write(empty)
+    return f
+
+
+def history_record(weather_data):
+    '''Records the weather_data sample in the slot of its time'''
+
+    print_entry("Recording weather history...")
+    try:
+        utc = int(weather_data['utc'])
+        if not utc:
+            print_error("...no time for weather sample")
+            return False
+        record = struct.pack(HISTORY_FMT, utc,
+                             int(weather_data['temp'] * 10),
+                             int(weather_data.get('pressure', 0) * 10),
+                             int(weather_data.get('humidity', 0)),
+                             min(int(weather_data.get('wind', 0)), 255))
+        with io_lock:
+            f = history_file()
+            f.seek(((utc // HISTORY_STEP) % HISTORY_SLOTS) * HISTORY_SIZE)
+            f.write(record)
+            f.close()
+        print_exit("...weather history recorded")
+        return True
+    except Exception as e:
+        print_error("...error recording weather history: %s" % (e))
+        return False
+
+
+def history_read(utc_end, span):
+    '''Returns the samples (utc, temp, pressure, humidity, wind) of the span seconds before utc_end, None for empty slots'''
+
+    nb = min(span // HISTORY_STEP, HISTORY_SLOTS)
+    first = utc_end // HISTORY_STEP - nb + 1
+    slot = first % HISTORY_SLOTS
+    nb_end = min(nb, HISTORY_SLOTS - slot)
+
+    try:
+        f = history_file()
+        f.seek(slot * HISTORY_SIZE)
+        buf = f.read(nb_end * HISTORY_SIZE)
+        if nb_end < nb:
+            f.seek(0)
+            buf += f.read((nb - nb_end) * HISTORY_SIZE)
+        f.close()
+    except Exception as e:
+        print_debug("Cannot read weather history: %s" % (e))
+        return []
+
+    samples = []
+    for i in range(nb):
+        utc, temp, pressure, humidity, wind = struct.unpack_from(HISTORY_FMT, buf, i * HISTORY_SIZE)
+        if utc // HISTORY_STEP != first + i:
+            samples.append(None)     # Empty slot or sample from an older turn of the ring
+        else:
+            samples.append((utc, temp / 10, pressure / 10, humidity, wind))
+    return samples
+
+
+#-------------------------------------------------
+#        Display functions
+#-------------------------------------------------
+
+def display_sparkline(display, values, x, y, w, h):
+    '''Draws values (None for gaps) as a sparkline in the w x h box at x, y, returns their min and max'''
+
+    points = [v for v in values if v is not None]
+    if not points:
+        return None, None
+    v_min = min(points)
+    v_max = max(points)
+    scale = (h - 1) / (v_max - v_min) if v_max > v_min else 0
+
+    # One point per pixel column, averaging the values falling into it
+    nb = len(values)
+    x_prev = y_prev = None
+    for c in range(min(w, nb)):
+        i_start = c * nb // min(w, nb)
+        i_end = max((c + 1) * nb // min(w, nb), i_start + 1)
+        column = [v for v in values[i_start:i_end] if v is not None]
+        if not column:
+            x_prev = None
+            continue
+        x_c = x + c * (w - 1) // max(min(w, nb) - 1, 1)
+        y_c = y + h - 1 - int((sum(column) / len(column) - v_min) * scale)
+        if x_prev is None:
+            display.pixel(x_c, y_c)
+        else:
+            display.line(x_prev, y_prev, x_c, y_c)
+        x_prev, y_prev = x_c, y_c
+    return v_min, v_max
+
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -0,0 +1,402 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                loop_badger.py                     #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Event loop shared by the pages of the Badger 2040:
+- data is fetched and parsed by a background task, cancelled when the page is refreshed again or left; the fetch
+  coroutine of the page gets the tab shown, whose data is fetched first, the other tabs being fetched meanwhile
+- buttons are polled all along, so that they stay responsive while fetching
+- the tab shown is redrawn from the data available whenever the user navigates, as soon as the fetch task reports
+  its data ready (ready function), and when the fetch completes
+- once idle, the page prefetches into the cache the data of the page most likely to be opened next, according
+  to the page transitions recorded on flash (badger_os state "nav"), within a budget of requests, bytes and free memory
+- then the page waits for a button (halt, or the idle function of the page)
+
+With DUAL_CORE, the work is split in a two-stage pipeline:
+- core 0 runs the event loop: network, parsing into the data store of the page, and buttons
+  (the WiFi driver has to stay on core 0)
+- core 1 runs the render stage: JPEG decoding, drawing and display update of the tabs handed off by core 0,
+  so that the next source is fetched while the previous one is drawn; the e-ink update runs once data_lock is
+  released, and the hash of the frame shown is recorded (on flash) by core 0
+- littlefs and the frame buffer are not safe to use from both cores at once: core 1 holds io_lock (store_badger.py)
+  while drawing and updating, core 0 holds it for each file or display access (store, locale, state, history,
+  WiFi connection status), always taken after data_lock
+The handoff is a single slot protected by a lock: a tab handed off replaces the one still waiting, as only the
+latest tab requested is worth drawing. The pages parse into their data store holding data_lock, that core 1 holds
+while drawing, so that a tab is never drawn from half parsed data
+
+"""
+
+import asyncio
+import _thread
+import badger2040w as badger2040
+import badger_os
+import gc
+from time import sleep_ms
+
+from common_badger import *
+from clock_badger import current_strings
+from sources_badger import page_sources
+from stats_badger import stats_page
+from mem_badger import mem_register, mem_update, mem_check, MEM_CACHE, MEM_DATA
+
+
+POLL_MS = 50    # Button polling period (ms)
+
+PAGE_BUTTONS = {
+    badger2040.BUTTON_A: "astro",
+    badger2040.BUTTON_B: "weather",
+    badger2040.BUTTON_C: "data"
+}
+
+PREFETCH_MIN = 3            # Transitions from the page to the next one needed before prefetching it
+PREFETCH_REQUESTS = 4       # Budget of requests prefetched per wake
+PREFETCH_BYTES = 65536      # Budget of bytes prefetched per wake
+PREFETCH_MEM_MIN = 24576    # Free memory needed to prefetch, beyond MEM_LOW
+
+nav_state = {
+    "last": "",
+    "counts": {}            # Page: {next page: number of transitions}
+}
+badger_os.state_load("nav", nav_state)
+
+prefetch_state = {
+    "requests": 0,          # Requests and bytes prefetched during this wake
+    "bytes": 0
+}
+
+ready_tabs = set()  # Tabs whose data has been parsed since last checked (fetch stage)
+
+data_lock = _thread.allocate_lock()     # Held while parsing into or drawing from the data store of the page
+render_lock = _thread.allocate_lock()
+render_slot = {
+    'next': None,       # Tab waiting to be drawn
+    'shown': None,      # Tab drawn last (draw may skip to another tab)
+    'hash': None,       # Hash of the frame shown by the last update, to be recorded by core 0
+    'busy': False,      # Tab waiting or being drawn
+    'stop': False,
+    'running': False
+}
+
+
+#-------------------------------------------------
+#        Fetch stage
+#-------------------------------------------------
+
+def ready(tabs):
+    '''Hands off the tabs whose data has just been parsed, to be redrawn if shown'''
+
+    ready_tabs.update(tabs)
+    return
+
+
+def pressed_button(display):
+    '''Returns the button pressed, None if none'''
+
+    for button in (badger2040.BUTTON_UP, badger2040.BUTTON_DOWN,
+                   badger2040.BUTTON_A, badger2040.BUTTON_B, badger2040.BUTTON_C):
+        if display.pressed(button):
+            return button
+    return None
+
+
+async def fetch_task(display, fetch, page, base, tab):
+    '''Runs the fetch coroutine (data of tab first) with the LED on, then measures the heap held by the data of page
+    (base: heap used before)'''
+
+    ready_tabs.clear()
+    display.led(128)
+    try:
+        await fetch(tab)
+    finally:
+        display.led(0)
+    gc.collect()
+    mem_update(page, max(gc.mem_alloc() - base, 0))
+
+
+#-------------------------------------------------
+#        Navigation history and prefetch
+#-------------------------------------------------
+
+def nav_record(page):
+    '''Records the transition from the page shown last to page'''
+
+    last = nav_state["last"]
+    if last and last != page:
+        counts = nav_state["counts"].setdefault(last, {})
+        counts[page] = counts.get(page, 0) + 1
+    nav_state["last"] = page
+    badger_os.state_save("nav", nav_state)
+    return
+
+
+def nav_next(page):
+    '''Returns the page most likely to be opened after page, None if not likely enough'''
+
+    counts = nav_state["counts"].get(page, {})
+    best = None
+    for next_page in counts:
+        if best is None or counts[next_page] > counts[best]:
+            best = next_page
+    if best is None or counts[best] < PREFETCH_MIN or counts[best] * 2 < sum(counts.values()):
+        return None
+    return best
+
+
+async def prefetch(page):
+    '''Prefetches into the cache the data of the page most likely to be opened after page, within the budget'''
+
+    next_page = nav_next(page)
+    if next_page is None or (THIN_CLIENT and next_page in THIN_PAGES):
+        return
+    print_entry("Prefetching %s data..." % (next_page))
+    cache_clean()
+    for key, url in page_sources(next_page, current_strings()):
+        if prefetch_state["requests"] >= PREFETCH_REQUESTS or prefetch_state["bytes"] >= PREFETCH_BYTES:
+            print_debug("Prefetch budget exhausted")
+            break
+        if not mem_check(PREFETCH_MEM_MIN, MEM_CACHE):
+            print_debug("Not enough memory to prefetch")
+            break
+        if cache_fresh(key):
+            continue
+        try:
+            status, body, encoding = await afetch(url)
+            # Kept decompressed in the cache, read like a response that was not compressed
+            if encoding and status == 200:
+                body = read_all(body_stream(BodyReader(body), encoding), arena["http"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print_error("...error prefetching %s: %s" % (key, e))
+            break
+        prefetch_state["requests"] += 1
+        prefetch_state["bytes"] += len(body)
+        if status == 200:
+            cache_put(key, body)
+    print_exit("...%s data prefetched" % (next_page))
+    return
+
+
+#-------------------------------------------------
+#        Render stage (core 1)
+#-------------------------------------------------
+
+def render_worker(display, draw):
+    '''Draws the tabs handed off by core 0, until stopped'''
+
+    print_debug("Render stage started on core 1")
+    while True:
+        with render_lock:
+            t = render_slot['next']
+            render_slot['next'] = None
+            if t is None:
+                render_slot['busy'] = False
+                if render_slot['stop']:
+                    render_slot['running'] = False
+                    return
+        if t is None:
+            sleep_ms(POLL_MS)
+            continue
+        h = None
+        try:
+            # data_lock first, as core 0 reads the store and locale files holding data_lock
+            data_lock.acquire()
+            io_lock.acquire()
+            try:
+                update_state["defer"] = _thread.get_ident()
+                try:
+                    t = draw(t)
+                finally:
+                    update_state["defer"] = None
+                    data_lock.release()
+                # Frame buffer drawn: core 0 parses meanwhile the e-ink update
+                h = display_flush(display)
+            finally:
+                io_lock.release()
+        except Exception as e:
+            print_error("...error drawing tab %s: %s" % (t, e))
+        with render_lock:
+            render_slot['shown'] = t
+            if h is not None:
+                render_slot['hash'] = h
+
+
+def render_start(display, draw):
+    '''Starts the render stage on core 1'''
+
+    render_slot['next'] = None
+    render_slot['shown'] = None
+    render_slot['hash'] = None
+    render_slot['busy'] = False
+    render_slot['stop'] = False
+    render_slot['running'] = True
+    _thread.start_new_thread(render_worker, (display, draw))
+    return
+
+
+def render_submit(t):
+    '''Hands off tab t to the render stage'''
+
+    with render_lock:
+        render_slot['next'] = t
+        render_slot['busy'] = True
+    return
+
+
+def render_done():
+    '''Returns the tab drawn last once the render stage is idle, None otherwise, recording the frame shown'''
+
+    with render_lock:
+        if render_slot['busy']:
+            return None
+        t = render_slot['shown']
+        h = render_slot['hash']
+        render_slot['shown'] = None
+        render_slot['hash'] = None
+    if h is not None:
+        frame_shown(h)
+    return t
+
+
+async def render_stop():
+    '''Stops the render stage once the tab being drawn is completed'''
+
+    with render_lock:
+        render_slot['stop'] = True
+    while render_slot['running']:
+        await asyncio.sleep_ms(POLL_MS)
+    if render_slot['hash'] is not None:
+        frame_shown(render_slot['hash'])
+        render_slot['hash'] = None
+    return
+
+
+#-------------------------------------------------
+#        Page loop
+#-------------------------------------------------
+
+async def page_loop(display, page, tab, tab_nb, fetch, draw, idle):
+    '''Runs the page until another page is requested, returns its name'''
+
+    gc.collect()
+    base = gc.mem_alloc()
+    mem_register(page, MEM_DATA, 0)
+    task = asyncio.create_task(fetch_task(display, fetch, page, base, tab))
+    arrived = set()     # Tabs drawn with the data of the current fetch
+    changed = True
+    rendering = False
+    prefetch_task = None
+    prefetched = False
+
+    if DUAL_CORE:
+        render_start(display, draw)
+
+    try:
+        while True:
+
+            if ready_tabs:
+                print_debug("Data ready for %s tabs %s" % (page, ready_tabs))
+                arrived.update(ready_tabs)
+                changed = changed or tab in ready_tabs
+                ready_tabs.clear()
+
+            if changed:
+                print_entry("Displaying %s tab %s..." % (page, tab))
+                if DUAL_CORE:
+                    render_submit(tab)
+                    rendering = True
+                else:
+                    tab = draw(tab)
+                changed = False
+                print_exit("...%s tab displayed" % (page))
+
+            if rendering:
+                shown = render_done()
+                if shown is not None:
+                    tab = shown
+                    rendering = False
+
+            if task is not None and task.done():
+                print_debug("Fetching %s data completed" % (page))
+                task = None
+                changed = changed or tab not in arrived
+                continue
+
+            button = pressed_button(display)
+            if button is None:
+                if task is not None or rendering or (prefetch_task is not None and not prefetch_task.done()):
+                    await asyncio.sleep_ms(POLL_MS)
+                elif not prefetched:
+                    # Data of the page fetched and drawn: prefetches the data of the next page meanwhile
+                    prefetch_task = asyncio.create_task(prefetch(page))
+                    prefetched = True
+                else:
+                    # Nothing left to do: waits for a button, or for updates if the page listens to them
+                    prefetch_task = None
+                    print_entry("Waiting for key pressed...")
+                    dirty = idle(tab)
+                    print_exit("...waiting completed")
+                    if dirty and tab in dirty:
+                        changed = True
+                continue
+
+            while display.pressed(button):
+                await asyncio.sleep_ms(POLL_MS)
+
+            if button == badger2040.BUTTON_DOWN:
+                print_debug("Button down detected")
+                tab = (tab + 1) % tab_nb
+                changed = True
+            elif button == badger2040.BUTTON_UP:
+                print_debug("Button up detected")
+                tab = (tab - 1) % tab_nb
+                changed = True
+            elif PAGE_BUTTONS[button] == page:
+                print_debug("Button %s detected, refreshing" % (page))
+                cache_state["use"] = False
+                if prefetch_task is not None:
+                    # The fetch reuses the http buffer of the prefetch
+                    prefetch_task.cancel()
+                    prefetch_task = None
+                if task is not None:
+                    task.cancel()
+                arrived = set()
+                task = asyncio.create_task(fetch_task(display, fetch, page, base, tab))
+            else:
+                print_debug("Button %s detected" % (PAGE_BUTTONS[button]))
+                return PAGE_BUTTONS[button]
+
+    finally:
+        if task is not None:
+            task.cancel()
+            await asyncio.sleep_ms(0)
+        if prefetch_task is not None:
+            prefetch_task.cancel()
+            await asyncio.sleep_ms(0)
+        if DUAL_CORE:
+            await render_stop()
+        await aclose_all()
+
+
+def run_page(display, page, tab, tab_nb, fetch, draw, idle):
+    '''Runs the page on the event loop, then launches the page requested'''
+
+    stats_page(page)
+    nav_record(page)
+    cache_state["use"] = True
+    next_page = asyncio.run(page_loop(display, page, tab, tab_nb, fetch, draw, idle))
+    launch_pages(next_page)
+    return
+
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -19,7 +19,21 @@ Notes:
 
 - Due to memory size limitation of the Badger, each request for a set of pages drops all functions from memory and loads the new functions on-the-fly (does not work otherwise)
 - Set the LAT, LONG, LOCATION, COUNTRY and TIMEZONE (For Europe's daylight saving time: 1 for wintertime, 2 for summertime) in common_badger.py
-- Info is displayed in French if COUNTRY == 'Fr', otherwise in English
+- Info is displayed in French if COUNTRY == 'Fr', otherwise in English: the texts of each locale are in resource files (copy the locale directory to /locale/ on the Badger), loaded on first use for the active locale only
+- Time is synced with NTP by clock_badger.py only when the estimated drift of the RTC exceeds DRIFT_MAX (last sync and drift rate are kept on flash)
+- Data is fetched in background by an asyncio event loop (loop_badger.py): buttons stay responsive while fetching, the data of the tab shown is fetched first and drawn as soon as it arrives, the other tabs being fetched meanwhile, and pressing the key of the page shown again cancels and restarts the fetch
+- With DUAL_CORE set in common_badger.py, the tabs are decoded and drawn on the second core while the next data source is fetched and parsed on the first one, each tab being drawn as soon as its data arrives; it is off by default, the filesystem and the display being shared by the two cores through io_lock (store_badger.py)
+- Energy and I/O usage (wakes, awake and WiFi time, requests and bytes per source, full, partial and skipped updates per page, JPEG decodes) is counted by stats_badger.py and kept on flash: shown on the Stats tab of the data page, printed with stats_print() and reset with stats_reset() from the REPL
+- Response bodies, JPEG files and the lines of text bodies are read in place into an arena of buffers allocated once at startup (HTTP_BUF_SIZE, JPEG_BUF_SIZE and LINE_MAX in common_badger.py), lines being split with no copy, to avoid heap fragmentation over days of uptime
+- HTTPS connections (IMCCE) are kept alive between the requests of a refresh, saving a TLS handshake per request (the ssl module of MicroPython cannot resume TLS sessions across connections); connections opened and kept alive are counted in the Stats tab
+- With COMPRESS in common_badger.py, responses are requested compressed (gzip or deflate) and decompressed on the fly by the deflate module of the firmware (MicroPython 1.21 or later, uncompressed otherwise): json and text lines are parsed from the decompressing stream, so the decompressed document is never held; the Stats tab counts the bytes received
+- Page transitions are recorded on flash: once a page is idle, the data of the page most likely to be opened next is prefetched into a flash cache (CACHE_TTL in common_badger.py), within a budget of requests, bytes and free memory per wake (PREFETCH_* in loop_badger.py), so that the next page is drawn without waiting for the network
+- Each tab is hashed with the data it shows and LAYOUT_VERSION (common_badger.py): when a tab is redrawn with the same content as the frame shown (same forecast, same ephemeris day), the e-ink update is skipped
+- The prefetch cache and the hash of the frame shown are kept in a log-structured key-value store on flash (store_badger.py): records are appended with their CRC32, indexed in RAM at boot by one scan of the log, and compacted once the log exceeds STORE_MAX, keeping the newest records up to STORE_KEEP
+- The heavy consumers of the heap (arena, data of the page, TLS connections kept alive, frame buffers of the thin client, caches) are registered in mem_badger.py with a priority: before a large allocation, the consumers of lower priority are evicted if less than MEM_LOW bytes would be left free, until MEM_HIGH bytes are; the heap usage is shown on the Stats tab and printed with mem_print() from the REPL
+- The planets ephemeris of EPHEM_DAYS days (sources_badger.py) are fetched from IMCCE in one request, parsed line by line as it is decompressed (bodies shown only, rise and set times as minutes, stopping once all are filled) and kept in the store by day: the astro page reads the day from flash with no request, and fetches the next days in background once EPHEM_MARGIN days or less are left (astro_badger.py)
+- The addresses of the hosts are cached in RAM and in the store for DNS_TTL seconds (common_badger.py), so that requests do not wait for a DNS resolution, and the last good address is used while resolution fails
+- The helpers called on every parse or draw (wind bearing, forecast hours, local times, visibility bars, ISS map position) use integer or fixed-point arithmetic compiled by the native and viper emitters (calc_badger.py); bench_badger.py compares them with the former floating point versions from the REPL
 - First pages to be displayed is Astro. To be changed below if another page should be displayed at boot time
 
 WEATHER:
@@ -27,35 +41,43 @@ WEATHER:
 A Python script (wethaer_badger.py) grabs weather data from openweathermap and displays them on Badger 2040 :
 - current weather condition (1st tab)
 - forecast for the next 4 days (other tabs)
+- temperature and pressure trends over 24h and 7 days (last tab, home location only)
+for each location of LOCATIONS (common_badger.py), one after the other
+
+Current weather and forecast of the home location are fetched in a single request (One Call API 3.0), or with two requests (current weather and 5 day forecast APIs) if the combined response lacks one of them. Current weather of the other locations is fetched in a single batched request (group API, by Open Weather Map city id), then their forecasts
 
 Requires
 - Weather images in /wicons/
 - Wind direction images in /windir/
 - common_badger.py library of common functions and data
-- Fill up OPENWEATHER_ID in the script
+- clock_badger.py clock service
+- history_badger.py weather history log (kept in /weather_history.bin)
+- sources_badger.py URLs of the data sources
+- Fill up OPENWEATHER_ID in sources_badger.py
 
 ASTRO:
 
 A Python script (astro_badger.py) grabs astronomical data and displays them on Badger 2040 :
-- planets ephemeris
-- Moon phase
-- ISS position
+- planets ephemeris, a week fetched at once
+- Moon phase (drawn from the phase angle, no image needed)
+- ISS position (live mode: the crosshair moves every ISS_LIVE_PERIOD seconds with a ground track, the map under it being redrawn from a 1-bit copy in RAM (astricons/world_map_m.bin) with no JPEG decode and the changed parts of the screen updated in as few partial updates as possible, for ISS_LIVE_AWAKE seconds before halting)
 
 Fetches info from :
 - Ephemeris data from IMCCE (More info: http://vo.imcce.fr/webservices/miriade/?rts#KnownBodies)
 - ISS location data from open-notify.org/iss-now.json
 
 Requires
-- Moon phase images in /Phases/
 - World map in /astricons/world_map_m.jpg
 - common_badger.py library of common functions and data
+- clock_badger.py clock service
 
 LOCAL DATA:
 
-A Python script (not included) grabs various data from local Pi and displays them on Badger 2040 :
+A Python script (data_badger.py) grabs various data from local Pi, in a single request of compact text lines, and displays them on Badger 2040 :
 - CO2 level
 - Strava data
 - Temperature from various locations
+- Usage counters of the Badger (Stats tab)
 
 Fetches info from :
 - Local Pi measuring CO2 level
@@ -63,19 +85,37 @@ Fetches info from :
 - Local Pi capturing temperature values for various location
 
 Requires
-- Local Pi to grab info from
+- Local Pi to grab info from (pi/data_server.py is a stand-in server serving demo data)
 - common_badger.py library of common functions and data
+- clock_badger.py clock service
+- push_badger.py listener for the updates pushed by the local Pi while the Badger is awake (UDP on PUSH_PORT)
+- Set PI_HOST, PI_PORT and PUSH_PORT in common_badger.py
+
+THIN CLIENT:
+
+A Python script (thin_badger.py) displays the astro and weather tabs pre-rendered by a local Pi, when THIN_CLIENT is set in common_badger.py :
+- each tab is downloaded as a packed 296x128 1-bit frame, only when its version changed
+- the local Pi (pi/frame_server.py, CPython + Pillow) fetches and caches the upstream data once for all the Badgers and renders the tabs with the same layouts and the same tabs (the locations given with --other, trends of the home location), again only when their data is refreshed
+- the layouts are drawn a second time in pi/frame_server.py with Pillow: a change to a tab layout in astro_badger.py or weather_badger.py has to be made there too, while the texts are read from the same locale files (--locale-dir) and drawn with bitmap fonts scaled by whole pixels (the Badger fonts converted to bitmap6.pil and bitmap8.pil with --fonts, the Pillow bitmap font otherwise)
 
+Requires
+- Local Pi running pi/frame_server.py with the images from wicons.zip, windir.zip and astricons.zip
+- common_badger.py library of common functions and data
+- Set THIN_CLIENT = True, PI_HOST and FRAME_PORT in common_badger.py
 
 """
 import badger2040w as badger2040
-from common_badger import display_status
+from common_badger import display_status, wifi_connect, THIN_CLIENT
 
 display = badger2040.Badger2040W()
 display.led(128)
 
 display_status(display, 'Connecting')
-display.connect()
+wifi_connect(display)
 
 # Boots with astro pages, to be changed to weather_badger or data_badger for other startup page
-import astro_badger 
+# In thin client mode, boots with the page shown last (astro the first time, see thin_badger.py)
+if THIN_CLIENT:
+    import thin_badger
+else:
+    import astro_badger 
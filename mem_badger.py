@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                mem_badger.py                      #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Heap budget of the Badger 2040:
+- the heavy consumers of the heap (buffers, data of the page, caches, connections kept alive) are registered with
+  a priority, their size, and the function freeing them if they can be rebuilt (fetched or computed again)
+- before a large allocation, mem_check makes sure it leaves MEM_LOW bytes free, evicting meanwhile the consumers
+  of lower priority than the allocation, the lowest first, until MEM_HIGH bytes are free
+- the lowest free heap, the highest heap used and the evictions are reported along with the size of each consumer
+  on the Stats tab of the data page, or from the REPL with mem_print()
+
+"""
+
+import gc
+
+
+MEM_LOW = 16384     # Free heap kept by the allocations
+MEM_HIGH = 32768    # Free heap restored by the evictions
+
+# Priorities, consumers are evicted lowest first
+MEM_CACHE = 0       # Caches, rebuilt when needed
+MEM_DATA = 1        # Data of the page
+MEM_BUFFER = 2      # Buffers allocated once
+
+consumers = {}      # Name: [priority, size, function freeing it (None if it cannot be)]
+mem_state = {
+    "free_min": None,   # Lowest free heap seen
+    "used_max": 0,      # Highest heap used seen
+    "evictions": 0
+}
+
+
+#-------------------------------------------------
+#        Consumer functions
+#-------------------------------------------------
+
+def mem_register(name, priority, size, evict=None):
+    '''Registers the consumer name of size bytes, freed by the evict function'''
+
+    consumers[name] = [priority, size, evict]
+    return
+
+
+def mem_update(name, size):
+    '''Updates the size of the consumer name'''
+
+    if name in consumers:
+        consumers[name][1] = size
+    return
+
+
+def mem_add(name, size):
+    '''Adds size bytes to the size of the consumer name'''
+
+    if name in consumers:
+        consumers[name][1] += size
+    return
+
+
+def mem_release(name):
+    '''Unregisters the consumer name'''
+
+    consumers.pop(name, None)
+    return
+
+
+#-------------------------------------------------
+#        Budget functions
+#-------------------------------------------------
+
+def mem_watch(free):
+    '''Records the lowest free heap and the highest heap used'''
+
+    if mem_state["free_min"] is None or free < mem_state["free_min"]:
+        mem_state["free_min"] = free
+    mem_state["used_max"] = max(mem_state["used_max"], gc.mem_alloc())
+    return free
+
+
+def mem_check(need=0, priority=MEM_DATA):
+    '''Makes room for an allocation of need bytes, evicting the consumers of lower priority if it would leave less
+    than MEM_LOW free, returns whether it does not'''
+
+    free = mem_watch(gc.mem_free())
+    if free - need >= MEM_LOW:
+        return True
+    gc.collect()
+    free = mem_watch(gc.mem_free())
+
+    evictable = [name for name in consumers
+                 if consumers[name][0] < priority and consumers[name][1] and consumers[name][2] is not None]
+    evictable.sort(key=lambda name: (consumers[name][0], -consumers[name][1]))
+    for name in evictable:
+        if free - need >= MEM_HIGH:
+            break
+        consumer = consumers[name]
+        consumer[2]()
+        consumer[1] = 0
+        mem_state["evictions"] += 1
+        gc.collect()
+        free = mem_watch(gc.mem_free())
+    return free - need >= MEM_LOW
+
+
+#-------------------------------------------------
+#        Reading functions
+#-------------------------------------------------
+
+def mem_lines():
+    '''Returns the heap usage as text lines'''
+
+    free = mem_watch(gc.mem_free())
+    lines = ["Heap free %0.1f kB (min %0.1f), used max %0.1f kB, %s evictions" % (
+        free / 1024, mem_state["free_min"] / 1024, mem_state["used_max"] / 1024, mem_state["evictions"])]
+    for name in consumers:
+        priority, size, evict = consumers[name]
+        lines.append("%s: %0.1f kB, priority %s%s" % (name, size / 1024, priority, "" if evict else ", fixed"))
+    return lines
+
+
+def mem_print():
+    '''Prints the heap usage (from the REPL)'''
+
+    for line in mem_lines():
+        print(line)
+    return
+
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                data_server.py                     #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Stand-in for the local Pi aggregator serving local data to data_badger.py, to be run with CPython:
+- serves GET /badger with the compact data lines (see data_badger.py)
+- lines are read from the file given as argument if any (reread at each request), demo values are served otherwise
+- with --push, sends the lines that changed to the Badger over UDP (see push_badger.py), checking every PERIOD seconds
+
+Usage: python3 data_server.py [-p PORT] [--push BADGER_HOST [--push-port PORT] [--period PERIOD]] [data_file]
+
+"""
+
+import argparse
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+DATA_PATH = "/badger"
+
+
+def demo_lines():
+    '''Returns demo data lines'''
+
+    now = int(time.time())
+    return [
+        "# Demo data from data_server.py",
+        "C;%s;%s" % (random.randint(450, 1500), now),
+        "S;W;3;42.5;380;2:13",
+        "S;M;11;156.2;1420;8:05",
+        "S;Y;134;1873.0;17260;96:40",
+        "T;Salon;%0.1f;%s" % (random.uniform(19, 23), random.randint(40, 60)),
+        "T;Bureau;%0.1f;%s" % (random.uniform(17, 21), random.randint(40, 60)),
+        "T;Jardin;%0.1f;%s" % (random.uniform(5, 25), random.randint(50, 90)),
+    ]
+
+
+def read_lines(data_file):
+    '''Returns the data lines from data_file, demo lines if none'''
+
+    if data_file:
+        with open(data_file) as f:
+            return f.read().splitlines()
+    return demo_lines()
+
+
+class DataHandler(BaseHTTPRequestHandler):
+    '''Serves the data lines'''
+
+    data_file = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != DATA_PATH:
+            self.send_error(404)
+            return
+        lines = read_lines(self.data_file)
+        body = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def push_changes(host, port, data_file, period):
+    '''Pushes to the Badger the data lines that changed since the last push'''
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = set()
+    while True:
+        lines = [line for line in read_lines(data_file) if line and line[0] != '#']
+        changed = [line for line in lines if line not in sent]
+        if changed:
+            s.sendto(('\n'.join(changed) + '\n').encode('utf-8'), (host, port))
+            print("Pushed %s line(s) to %s" % (len(changed), host))
+        sent = set(lines)
+        time.sleep(period)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local data server for data_badger.py")
+    parser.add_argument("-p", "--port", type=int, default=8080)
+    parser.add_argument("--push", metavar="BADGER_HOST", help="pushes changed lines to the Badger")
+    parser.add_argument("--push-port", type=int, default=8081)
+    parser.add_argument("--period", type=float, default=30)
+    parser.add_argument("data_file", nargs="?")
+    args = parser.parse_args()
+
+    if args.push:
+        threading.Thread(target=push_changes, daemon=True,
+                         args=(args.push, args.push_port, args.data_file, args.period)).start()
+
+    DataHandler.data_file = args.data_file
+    server = HTTPServer(("", args.port), DataHandler)
+    print("Serving local data on port %s" % (args.port))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -0,0 +1,760 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                frame_server.py                    #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Aggregation proxy for a fleet of Badger 2040 in thin client mode (see thin_badger.py), to be run with CPython on a local Pi:
+- fetches and caches the upstream data once for all the Badgers (openweathermap, IMCCE, open-notify)
+- renders each tab with the layouts of weather_badger.py and astro_badger.py into a packed 296x128 1-bit frame
+  (drawn again here with Pillow: a change to a tab layout of the Badger has to be made here too), with the same tabs:
+  current weather, FORECAST_NB forecast days and trends (home only) of each location, ephemeris, ISS and Moon
+- text is drawn with bitmap fonts scaled by whole pixels as on the Badger: bitmap6.pil and bitmap8.pil of the fonts
+  directory (the Badger fonts converted with pilfont), the built-in bitmap font of Pillow otherwise
+- a tab is rendered again only when one of its sources was refreshed, the frames being kept in between
+- serves the frames over plain HTTP, with a version so that unchanged frames are not downloaded again
+
+HTTP API:
+- GET /frames/<page>                    one line per tab: <tab>;<version>
+- GET /frames/<page>/<tab>[?v=<ver>]    frame (37 bytes per row, MSB first, 1 for black), 304 if still at version ver
+
+Requires
+- Pillow (pip3 install pillow)
+- Weather images in <icons>/wicons/, wind direction images in <icons>/windir/, world map in <icons>/astricons/
+  (unzipped from wicons.zip, windir.zip and astricons.zip)
+- Locale resource files of the Badger in <locale-dir>/ (the locale directory of the repository by default)
+
+Usage: python3 frame_server.py --owm-id OPENWEATHER_ID [--lat LAT --long LONG --location LOCATION --country COUNTRY
+                               --timezone TIMEZONE] [--other NAME,COUNTRY,LAT,LONG ...] [--icons DIR] [--fonts DIR]
+                               [--locale-dir DIR] [-p PORT]
+
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw, ImageFont
+
+WIDTH = 296
+HEIGHT = 128
+FRAME_SIZE = (WIDTH + 7) // 8 * HEIGHT
+
+OPENWEATHER_ONE = "http://api.openweathermap.org/data/3.0/onecall?lat=%s&lon=%s&exclude=minutely,alerts&units=metric&appid=%s"
+OPENWEATHER_FOR = "http://api.openweathermap.org/data/2.5/forecast?q=%s&units=metric&appid=%s"
+OPENWEATHER_WEA = "http://api.openweathermap.org/data/2.5/weather?q=%s&units=metric&appid=%s"
+EPHEM_URL = "https://vo.imcce.fr/webservices/miriade/rts_query.php?-mime=text&-ep=%s&-body=2,4,5,6,10,11&-long=%s&-lat=%s"
+MOON_URL = "https://vo.imcce.fr/webservices/miriade/ephemcc_query.php?-mime=json&-ep=%s-%s&-name=s:moon"
+ISS_URL = "http://api.open-notify.org/iss-now.json"
+
+# Seconds upstream data is kept before being fetched again
+WEATHER_TTL = 600
+EPHEM_TTL = 6 * 3600
+MOON_TTL = 3600
+ISS_TTL = 30
+
+FORECAST_NB = 4
+LOC_TAB_NB = FORECAST_NB + 2   # Current weather, forecast days and trends of a location, as on the Badger
+FORECAST_HOURS = ('09', '12', '18')
+BODY_LIST = ["Sun", "Moon", "Venus", "Mars", "Jupiter", "Saturn"]
+DIRS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+ICONS = {"01": "sun", "02": "few-cloud", "03": "clouds", "04": "clouds", "09": "rain",
+         "10": "rain", "11": "storm", "13": "snow", "50": "myst"}
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "locale")
+
+HISTORY_STEP = 1800                 # Weather history of the home location: one sample every 30 minutes...
+HISTORY_SPAN = 7 * 86400            # ...for 7 days, kept in memory
+TREND_SPANS = (86400, 7 * 86400)    # Spans of the trends, named in the locale table
+
+
+#-------------------------------------------------
+#        Canvas with the Badger display functions
+#-------------------------------------------------
+
+class Canvas:
+    '''1-bit image drawn with the same calls as the Badger display (pen 0 is black, 15 is white)'''
+
+    fonts = {}
+
+    def __init__(self, icons, fonts_dir=None):
+        self.icons = icons
+        self.fonts_dir = fonts_dir
+        self.image = Image.new("1", (WIDTH, HEIGHT), 1)
+        self.draw = ImageDraw.Draw(self.image)
+        self.pen = 0
+        self.font_name = "bitmap8"
+
+    def set_pen(self, pen):
+        self.pen = 1 if pen >= 8 else 0
+
+    def set_font(self, name):
+        self.font_name = name
+
+    def clear(self):
+        self.draw.rectangle((0, 0, WIDTH, HEIGHT), fill=self.pen)
+
+    def pixel(self, x, y):
+        self.draw.point((x, y), fill=self.pen)
+
+    def line(self, x1, y1, x2, y2):
+        self.draw.line((x1, y1, x2, y2), fill=self.pen)
+
+    def rectangle(self, x, y, w, h):
+        if w > 0 and h > 0:
+            self.draw.rectangle((x, y, x + w - 1, y + h - 1), fill=self.pen)
+
+    def circle(self, x, y, r):
+        self.draw.ellipse((x - r, y - r, x + r, y + r), fill=self.pen)
+
+    def font(self):
+        '''Returns the bitmap font set, loaded once'''
+
+        if self.font_name not in self.fonts:
+            path = os.path.join(self.fonts_dir or '', "%s.pil" % (self.font_name))
+            if self.fonts_dir and os.path.exists(path):
+                self.fonts[self.font_name] = ImageFont.load(path)
+            elif hasattr(ImageFont, "load_default_imagefont"):
+                self.fonts[self.font_name] = ImageFont.load_default_imagefont()
+            else:
+                self.fonts[self.font_name] = ImageFont.load_default()
+        return self.fonts[self.font_name]
+
+    def text(self, text, x, y, wordwrap=WIDTH, scale=2):
+        '''Draws text with each pixel of the glyphs drawn as a scale x scale square, as on the Badger'''
+
+        font = self.font()
+        left, top, right, bottom = font.getbbox(text)
+        if right <= 0 or bottom <= 0:
+            return
+        glyphs = Image.new("1", (right, bottom), 0)
+        ImageDraw.Draw(glyphs).text((0, 0), text, font=font, fill=1)
+        glyphs = glyphs.resize((right * scale, bottom * scale), Image.NEAREST)
+        self.image.paste(self.pen, (x, y, x + right * scale, y + bottom * scale), glyphs)
+
+    def measure_text(self, text, scale=2):
+        return int(self.font().getlength(text)) * scale
+
+    def jpeg(self, path, x, y):
+        '''Draws the JPEG image path (relative to the icons directory), dithered to 1 bit'''
+
+        try:
+            icon = Image.open(os.path.join(self.icons, path.lstrip('/'))).convert("1")
+            self.image.paste(icon, (x, y))
+        except OSError as e:
+            print("Cannot open %s: %s" % (path, e))
+
+    def frame(self):
+        '''Returns the packed frame: 37 bytes per row, MSB first, 1 for black'''
+
+        return bytes(b ^ 0xFF for b in self.image.tobytes())
+
+
+def flush_text_right(display, text, x, y, s):
+    w = display.measure_text(text, s)
+    display.text(text, max(x - w, 0), y, x, s)
+
+
+def center_text(display, text, x, y, s):
+    w = display.measure_text(text, s)
+    display.text(text, max(x - int(w / 2), 0), y, w, s)
+
+
+def display_title(display, title_string, h=WIDTH):
+    display.set_font("bitmap6")
+    display.set_pen(0)
+    display.rectangle(0, 0, h, 20)
+    display.set_pen(15)
+    w = display.measure_text(title_string)
+    display.text(title_string, int((h - w) / 2), 4)
+    display.set_pen(0)
+
+
+def display_menu(display, locale):
+    display.set_font("bitmap6")
+    display.set_pen(0)
+    display.rectangle(0, 118, WIDTH, 10)
+    display.set_pen(15)
+    display.text(locale['page_names'][0], 40, 120, 100, 1)
+    display.text(locale['page_names'][1], 136, 120, 100, 1)
+    display.text(locale['page_names'][2], 242, 120, 100, 1)
+    display.set_pen(0)
+
+
+def display_tab_status(display, t, tab_nb):
+    y = 64 - tab_nb * 5
+    for i in range(tab_nb):
+        display.set_pen(0)
+        display.rectangle(286, y, 8, 8)
+        if i != t:
+            display.set_pen(15)
+            display.rectangle(287, y + 1, 6, 6)
+        y += 10
+
+
+def display_error(display, text):
+    display.set_pen(0)
+    display.rectangle(0, 60, WIDTH, 25)
+    display.set_pen(15)
+    display.text(text, 5, 65, WIDTH, 1)
+    display.set_pen(0)
+
+
+#-------------------------------------------------
+#        Upstream data
+#-------------------------------------------------
+
+class Source:
+    '''Upstream data fetched at most once every ttl seconds, whatever the number of Badgers'''
+
+    def __init__(self, name, ttl, fetch):
+        self.name = name
+        self.ttl = ttl
+        self.fetch = fetch
+        self.data = None
+        self.t = 0
+        self.version = 0        # Incremented on each refresh, for the frames drawn from the data to be rendered again
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.data is None or time.time() - self.t > self.ttl:
+                try:
+                    self.data = self.fetch()
+                    self.t = time.time()
+                    self.version += 1
+                    print("%s data fetched" % (self.name))
+                except Exception as e:
+                    print("Cannot fetch %s data: %s" % (self.name, e))
+            return self.data
+
+    def refresh(self):
+        '''Fetches the data again if older than ttl, returns its version'''
+
+        self.get()
+        return self.version
+
+
+def fetch_url(url):
+    with urllib.request.urlopen(url, timeout=20) as r:
+        return r.read().decode("utf-8")
+
+
+def load_locale(locale_dir, country):
+    '''Returns the texts of the locale of country, read from the locale resource files shared with the Badger'''
+
+    lang = 'fr' if country == 'Fr' else 'en'
+    tables = {}
+    for name in ("common", "weather", "astro"):
+        with open(os.path.join(locale_dir, "%s_%s.json" % (name, lang)), encoding="utf-8") as f:
+            tables[name] = json.load(f)
+    weather = tables["weather"]
+    # Conditions listed in the order of the weather codes, night ones (code + 'n') overriding them
+    conditions = dict(zip(ICONS, weather["conditions"]))
+    conditions.update([(code + 'n', name) for code, name in weather["night"].items()])
+    return {
+        'weekdays': tables["common"]["weekdays"],
+        'rise_set': tables["common"]["rise_set"],
+        'page_names': tables["common"]["pages"],
+        'weather_tabs': weather["tabs"],
+        'trends': weather["trends"],
+        'astro_tabs': tables["astro"]["tabs"],
+        'phases_waxing': tables["astro"]["waxing"],
+        'phases_waning': tables["astro"]["waning"],
+        'bodies': tables["astro"]["bodies"],
+        'conditions': conditions
+    }
+
+
+def calculate_bearing(d):
+    return DIRS[round(d / (360. / len(DIRS))) % len(DIRS)]
+
+
+def read_conditions(locale, temp, wind, deg, weather):
+    '''Parses the temperature, wind and weather condition of an Open Weather Map entry'''
+
+    try:
+        code = weather[0]["icon"]
+    except (TypeError, KeyError, IndexError):
+        code = '?'
+    conditions = locale['conditions']
+    return {
+        'temp': float(temp or 0.),
+        'wind': float(wind or 0.) * 3.6,
+        'wind_dir': calculate_bearing(deg) if deg is not None else '?',
+        'condition_code': code,
+        'condition_name': conditions.get(code, conditions.get(code[:2], '?'))
+    }
+
+
+class Weather:
+    '''Current weather and forecast of a location (name, country, lat, long), in a single request when possible, with
+    the weather history of the home location'''
+
+    def __init__(self, config, locale, location, home=False):
+        self.config = config
+        self.locale = locale
+        self.location = location
+        self.history = {} if home else None     # Slot of HISTORY_STEP: (utc, temp, pressure)
+        self.source = Source("weather %s" % (location[0]), WEATHER_TTL, self.fetch)
+
+    def fetch(self):
+        c = self.config
+        name, country, lat, long = self.location
+        try:
+            combined = json.loads(fetch_url(OPENWEATHER_ONE % (lat, long, c.owm_id)))
+            current = combined["current"]
+            now = {'utc': current["dt"], 'pressure': current.get("pressure", 0)}
+            now.update(read_conditions(self.locale, current.get("temp"), current.get("wind_speed"),
+                                       current.get("wind_deg"), current.get("weather")))
+            entries = [(f["dt"], read_conditions(self.locale, f.get("temp"), f.get("wind_speed"),
+                                                 f.get("wind_deg"), f.get("weather")))
+                       for f in combined["hourly"]]
+        except (OSError, KeyError, ValueError):
+            q = "%s,%s" % (name, country)
+            current = json.loads(fetch_url(OPENWEATHER_WEA % (q, c.owm_id)))
+            now = {'utc': current["dt"]}
+            now.update(read_conditions(self.locale, current["main"].get("temp"), current["wind"].get("speed"),
+                                       current["wind"].get("deg"), current.get("weather")))
+            forecast = json.loads(fetch_url(OPENWEATHER_FOR % (q, c.owm_id)))
+            entries = [(f["dt"], read_conditions(self.locale, f["main"].get("temp"), f["wind"].get("speed"),
+                                                 f["wind"].get("deg"), f.get("weather")))
+                       for f in forecast["list"]]
+
+        # Forecast bucketed by UT day and hour, as on the Badger
+        days = []
+        for utc, conditions in entries:
+            dt = time.gmtime(utc)
+            hr = '%02d' % (dt.tm_hour)
+            if hr not in FORECAST_HOURS:
+                continue
+            if not days or days[-1]['weekday'] != dt.tm_wday:
+                if len(days) >= FORECAST_NB:
+                    break
+                days.append({'weekday': dt.tm_wday, 'nameday': self.locale['weekdays'][dt.tm_wday], 'hours': {}})
+            days[-1]['hours'][hr] = conditions
+
+        if self.history is not None:
+            self.history[now['utc'] // HISTORY_STEP] = (now['utc'], now['temp'], now.get('pressure', 0))
+            for slot in [slot for slot in self.history if slot <= (now['utc'] - HISTORY_SPAN) // HISTORY_STEP]:
+                del self.history[slot]
+        return {'now': now, 'days': days}
+
+    def history_read(self, utc_end, span):
+        '''Returns the samples (utc, temp, pressure) of the span seconds before utc_end, None for empty slots'''
+
+        first = utc_end // HISTORY_STEP - span // HISTORY_STEP + 1
+        return [self.history.get(slot) for slot in range(first, utc_end // HISTORY_STEP + 1)]
+
+
+class Astro:
+    '''ISS position, ephemeris and moon phase'''
+
+    def __init__(self, config, locale):
+        self.config = config
+        self.locale = locale
+        self.iss = Source("ISS", ISS_TTL, self.fetch_iss)
+        self.ephem = Source("ephemeris", EPHEM_TTL, self.fetch_ephem)
+        self.moon = Source("moon", MOON_TTL, self.fetch_moon)
+
+    def fetch_iss(self):
+        position = json.loads(fetch_url(ISS_URL))['iss_position']
+        return float(position['latitude']), float(position['longitude'])
+
+    def fetch_ephem(self):
+        d = time.gmtime()
+        text = fetch_url(EPHEM_URL % ("%s-%s-%s" % (d.tm_year, d.tm_mon, d.tm_mday),
+                                      self.config.long, self.config.lat))
+        ephem = {}
+        for line in text.split('\n'):
+            if not line or line[0] == '#':
+                continue
+            fields = [f.strip() for f in line.split(',')]
+            body = ephem.setdefault(fields[0], {'rise': '-', 'set': '-'})
+            for key, i in (('rise', 2), ('set', 6)):
+                if body[key] == '-':
+                    body[key] = fields[i]
+        return ephem
+
+    def fetch_moon(self):
+        phases = []
+        for t in (time.time(), time.time() + 86400):
+            d = time.gmtime(t)
+            url = MOON_URL % ("%s-%s-%s" % (d.tm_year, d.tm_mon, d.tm_mday), "%02d:%02d" % (d.tm_hour, d.tm_min))
+            phases.append(float(json.loads(fetch_url(url))["data"][0]["phase"]))
+        return phases
+
+
+#-------------------------------------------------
+#        Tab layouts (same as the Badger pages)
+#-------------------------------------------------
+
+def local_hm(config, hm):
+    '''Converts a UT "hh:mm" string into local hours, minutes and string'''
+
+    try:
+        h, m = hm.split(':')[:2]
+        h = (int(h) + config.timezone) % 24
+        m = int(m)
+    except ValueError:
+        h = m = 0
+    return h, m, "%02d:%02d" % (h, m)
+
+
+def local_now(config):
+    d = time.gmtime(time.time() + config.timezone * 3600)
+    return d, "%s/%s" % (d.tm_mday, d.tm_mon), "%02d:%02d" % (d.tm_hour, d.tm_min)
+
+
+def draw_current_weather(display, server, weather):
+    data = weather.source.get()
+    locale = server.locale
+    if not data:
+        display_error(display, "Unable to display weather!")
+        return
+    now = data['now']
+    dt = time.gmtime(now['utc'] + server.config.timezone * 3600)
+    display_title(display, "%s %s, %s %02d:%02d" % (locale['weather_tabs'][0], weather.location[0],
+                                                   locale['weekdays'][dt.tm_wday], dt.tm_hour, dt.tm_min))
+    display.set_font("bitmap8")
+    display.jpeg("/wicons/icon-%s.jpg" % (ICONS.get(now['condition_code'][:2], "clouds")), 13, 30)
+    display.jpeg("/wicons/icon-tn-wind.jpg", 98, 68)
+    display.set_pen(0)
+    display.text(now['condition_name'], 98, 28, WIDTH - 105, 2)
+    display.text("T°", 98, 48, WIDTH - 105, 2)
+    display.text("%0.0f °C" % (now['temp']), 158, 48, WIDTH - 105, 2)
+    display.text("%0.0f km/h" % (now['wind']), 158, 68, WIDTH - 105, 2)
+    display.text(now['wind_dir'], 188, 88, WIDTH - 105, 2)
+    display.jpeg("/windir/%s.jpg" % (now['wind_dir']), 158, 88)
+
+
+def draw_forecast(display, server, weather, day):
+    data = weather.source.get()
+    locale = server.locale
+    if not data or day >= len(data['days']):
+        display_error(display, "Unable to display weather!")
+        return
+    daily = data['days'][day]
+    display_title(display, "%s %s, %s" % (locale['weather_tabs'][1], weather.location[0], daily['nameday']))
+    display.set_font("bitmap8")
+    display.line(26, 20, 26, 120)
+    display.line(116, 20, 116, 120)
+    display.line(206, 20, 206, 120)
+    display.jpeg("/wicons/icon-tn-wind.jpg", 0, 88)
+    display.set_pen(0)
+    display.text("T°", 3, 60, 40, 2)
+    for hr, x_hr in (('09', 26), ('12', 116), ('18', 206)):
+        if hr not in daily['hours']:
+            continue
+        forecast = daily['hours'][hr]
+        display.jpeg("/wicons/icon-sm-%s.jpg" % (ICONS.get(forecast['condition_code'][:2], "clouds")), x_hr + 25, 20)
+        display.set_pen(0)
+        center_text(display, "%0.0f °C" % (forecast['temp']), x_hr + 45, 60, 2)
+        center_text(display, "%0.0f km/h" % (forecast['wind']), x_hr + 45, 80, 2)
+        display.text(forecast['wind_dir'], x_hr + 45, 100, x_hr + 100, 2)
+        display.jpeg("/windir/%s.jpg" % (forecast['wind_dir']), x_hr + 20, 98)
+
+
+def display_sparkline(display, values, x, y, w, h):
+    '''Draws values (None for gaps) as a sparkline in the w x h box at x, y, returns their min and max'''
+
+    points = [v for v in values if v is not None]
+    if not points:
+        return None, None
+    v_min = min(points)
+    v_max = max(points)
+    scale = (h - 1) / (v_max - v_min) if v_max > v_min else 0
+
+    # One point per pixel column, averaging the values falling into it
+    nb = len(values)
+    x_prev = y_prev = None
+    for c in range(min(w, nb)):
+        i_start = c * nb // min(w, nb)
+        i_end = max((c + 1) * nb // min(w, nb), i_start + 1)
+        column = [v for v in values[i_start:i_end] if v is not None]
+        if not column:
+            x_prev = None
+            continue
+        x_c = x + c * (w - 1) // max(min(w, nb) - 1, 1)
+        y_c = y + h - 1 - int((sum(column) / len(column) - v_min) * scale)
+        if x_prev is None:
+            display.pixel(x_c, y_c)
+        else:
+            display.line(x_prev, y_prev, x_c, y_c)
+        x_prev, y_prev = x_c, y_c
+    return v_min, v_max
+
+
+def draw_trend(display, server, weather):
+    data = weather.source.get()
+    locale = server.locale
+    if not data:
+        display_error(display, "Unable to display weather!")
+        return
+    display_title(display, "%s %s" % (locale['weather_tabs'][2], weather.location[0]))
+    display.set_font("bitmap6")
+    display.set_pen(0)
+    display.text("T°", 4, 44, 40, 2)
+    display.text("hPa", 4, 90, 40, 1)
+    x = 36
+    for span_name, span in zip(locale['trends'], TREND_SPANS):
+        samples = weather.history_read(data['now']['utc'], span)
+        temps = [sample[1] if sample else None for sample in samples]
+        pressures = [sample[2] if sample and sample[2] else None for sample in samples]
+        t_min, t_max = display_sparkline(display, temps, x, 34, 120, 28)
+        if t_min is not None:
+            display.text("%s: %0.0f/%0.0f °C" % (span_name, t_min, t_max), x, 24, 120, 1)
+        p_min, p_max = display_sparkline(display, pressures, x, 80, 120, 28)
+        if p_min is not None:
+            display.text("%s: %0.0f/%0.0f hPa" % (span_name, p_min, p_max), x, 70, 120, 1)
+        x += 125
+
+
+def draw_ephem(display, server):
+    ephem = server.astro.ephem.get()
+    locale = server.locale
+    d, date_dm, time_hm = local_now(server.config)
+    display_title(display, "%s %s, %s %s" % (locale['astro_tabs'][0], server.config.location,
+                                            locale['weekdays'][d.tm_wday], date_dm))
+    if not ephem:
+        return
+    x_0h = 105
+    x_24h = 255
+    y = 22
+    for body in BODY_LIST:
+        if body not in ephem:
+            continue
+        display.set_pen(0)
+        display.set_font("bitmap8")
+        flush_text_right(display, locale['bodies'].get(body, body), x_0h - 30, y, 2)
+        display.line(x_0h, y + 10, x_24h, y + 10)
+        rise_h, rise_m, rise_hm = local_hm(server.config, ephem[body]['rise'])
+        set_h, set_m, set_hm = local_hm(server.config, ephem[body]['set'])
+        display.text(rise_hm, x_0h - 25, y + 6, 20, 1)
+        display.text(set_hm, x_24h + 5, y + 6, 20, 1)
+        d = x_24h - x_0h
+        r = int((rise_h + rise_m / 60) * d / 24)
+        s = int((set_h + set_m / 60) * d / 24)
+        if r < s:
+            display.rectangle(r + x_0h, y + 8, s - r, 8)
+        else:
+            display.rectangle(x_0h, y + 8, s, 8)
+            display.rectangle(x_0h + r, y + 8, d - r, 8)
+        y += 15
+
+
+def draw_iss(display, server):
+    iss = server.astro.iss.get()
+    locale = server.locale
+    if not iss:
+        return
+    lat_iss, long_iss = iss
+    x_iss_map = 110
+    d, date_dm, time_hm = local_now(server.config)
+    display_title(display, locale['astro_tabs'][1], x_iss_map)
+    display.set_pen(0)
+    display.text("%s %s" % (locale['weekdays'][d.tm_wday], date_dm), 4, 24)
+    display.text(time_hm, 4, 44)
+    display.text("Lat", 4, 64)
+    display.text("%0.0f %s" % (abs(lat_iss), "S" if lat_iss < 0 else "N"), 60, 64)
+    display.text("Long", 4, 84)
+    display.text("%0.0f %s" % (abs(long_iss), "W" if long_iss < 0 else "E"), 60, 84)
+    display.jpeg("/astricons/world_map_m.jpg", x_iss_map, 0)
+    x = int(0.49 * long_iss + 87.5) % 175 + x_iss_map
+    y = int(-0.67 * lat_iss + 60)
+    display.set_pen(0)
+    display.line(x, 0, x, 120)
+    display.line(x_iss_map, y, 175 + x_iss_map, y)
+
+
+def draw_moon(display, server):
+    phases = server.astro.moon.get()
+    ephem = server.astro.ephem.get() or {}
+    locale = server.locale
+    if not phases:
+        return
+    phase, phase1 = phases
+    waxing = phase1 < phase
+    ix = round(phase / 45)
+    phase_name = locale['phases_waxing' if waxing else 'phases_waning'][ix]
+
+    # Dark disk, then the lit part of each row from the limb to the terminator
+    x_moon, y_moon, r = 234, 66, 50
+    display.set_pen(0)
+    display.circle(x_moon, y_moon, r)
+    display.set_pen(15)
+    k = math.cos(math.radians(phase))
+    lit_right = waxing == (server.config.lat >= 0)
+    for i in range(2 * (r - 1)):
+        w = int(math.sqrt((r - 1) ** 2 - (i - r + 1.5) ** 2) + 0.5)
+        t = int(w * k)
+        x_start, x_end = (x_moon - t, x_moon + w) if lit_right else (x_moon - w, x_moon + t)
+        display.rectangle(x_start, y_moon - r + 1 + i, x_end - x_start, 1)
+
+    d, date_dm, time_hm = local_now(server.config)
+    display_title(display, locale['astro_tabs'][2], 180)
+    display.set_pen(0)
+    display.text("%s %s %s" % (locale['weekdays'][d.tm_wday], date_dm, time_hm), 4, 24)
+    display.text("Phase: %0.0f° (%s)" % (phase, phase_name), 4, 44)
+    rise_set = locale['rise_set']
+    display.text(rise_set[0], 4, 64)
+    display.text(rise_set[1], 4, 84)
+    moon = ephem.get('Moon', {})
+    display.text(local_hm(server.config, moon['rise'])[2] if 'rise' in moon else '',
+                 display.measure_text(rise_set[0]) + 10, 64)
+    display.text(local_hm(server.config, moon['set'])[2] if 'set' in moon else '',
+                 display.measure_text(rise_set[1]) + 10, 84)
+
+
+#-------------------------------------------------
+#        Frames
+#-------------------------------------------------
+
+class FrameServer:
+    '''Renders and keeps the frames of all the tabs of each page'''
+
+    def __init__(self, config):
+        self.config = config
+        self.locale = load_locale(config.locale_dir, config.country)
+        locations = [(config.location, config.country, config.lat, config.long)] + config.other
+        self.weathers = [Weather(config, self.locale, location, i == 0) for i, location in enumerate(locations)]
+        self.astro = Astro(config, self.locale)
+
+        # Tabs of each page: draw function, sources drawn from, tab and number of tabs shown by the tab status
+        weather_tabs = []
+        for i, weather in enumerate(self.weathers):
+            weather_tabs.append((lambda display, server, w=weather: draw_current_weather(display, server, w),
+                                 [weather.source], 0))
+            weather_tabs += [(lambda display, server, w=weather, day=day: draw_forecast(display, server, w, day),
+                              [weather.source], day + 1) for day in range(FORECAST_NB)]
+            if i == 0:
+                # Trends of the home location only, skipped on the Badger for the other ones
+                weather_tabs.append((lambda display, server, w=weather: draw_trend(display, server, w),
+                                     [weather.source], LOC_TAB_NB - 1))
+        self.pages = {
+            "weather": [(draw, sources, (t, LOC_TAB_NB)) for draw, sources, t in weather_tabs],
+            "astro": [(draw_ephem, [self.astro.ephem], (0, 3)),
+                      (draw_iss, [self.astro.iss], (1, 3)),
+                      (draw_moon, [self.astro.moon, self.astro.ephem], (2, 3))]
+        }
+        self.frames = {}        # (page, tab): frame, version and versions of the sources it was drawn from
+        self.lock = threading.Lock()
+
+    def render(self, page, tab):
+        '''Renders the tab of page, returns its frame and version'''
+
+        draw, sources, status = self.pages[page][tab]
+        display = Canvas(self.config.icons, self.config.fonts)
+        display.set_pen(15)
+        display.clear()
+        display.set_pen(0)
+        display_menu(display, self.locale)
+        draw(display, self)
+        display_tab_status(display, *status)
+        frame = display.frame()
+        return frame, "%08x" % (zlib.crc32(frame))
+
+    def frame(self, page, tab):
+        '''Returns the frame of the tab of page and its version, rendered again only when one of its sources was
+        refreshed'''
+
+        versions = [source.refresh() for source in self.pages[page][tab][1]]
+        with self.lock:
+            kept = self.frames.get((page, tab))
+        if kept is not None and kept[2] == versions:
+            return kept[0], kept[1]
+        frame, version = self.render(page, tab)
+        with self.lock:
+            self.frames[(page, tab)] = (frame, version, versions)
+        return frame, version
+
+    def index(self, page):
+        return [(tab, self.frame(page, tab)[1]) for tab in range(len(self.pages[page]))]
+
+
+class FrameHandler(BaseHTTPRequestHandler):
+    '''Serves the frames'''
+
+    server_frames = None
+
+    def send_body(self, body, content_type, version=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if version:
+            self.send_header("X-Frame-Version", version)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        parts = path.strip('/').split('/')
+        frames = self.server_frames
+        if len(parts) < 2 or parts[0] != "frames" or parts[1] not in frames.pages:
+            self.send_error(404)
+            return
+        page = parts[1]
+
+        if len(parts) == 2:
+            body = ''.join("%s;%s\n" % (tab, version) for tab, version in frames.index(page))
+            self.send_body(body.encode(), "text/plain")
+            return
+
+        try:
+            tab = int(parts[2])
+            frame, version = frames.frame(page, tab)
+        except (ValueError, IndexError):
+            self.send_error(404)
+            return
+        if "v=%s" % (version) in query.split('&'):
+            self.send_response(304)
+            self.send_header("X-Frame-Version", version)
+            self.end_headers()
+            return
+        self.send_body(frame, "application/octet-stream", version)
+
+
+def parse_location(text):
+    name, country, lat, long = text.split(',')
+    return name, country, float(lat), float(long)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-rendered frame server for Badgers in thin client mode")
+    parser.add_argument("-p", "--port", type=int, default=8082)
+    parser.add_argument("--owm-id", required=True, help="OPENWEATHER_ID")
+    parser.add_argument("--lat", type=float, default=48.828)
+    parser.add_argument("--long", type=float, default=-2.330)
+    parser.add_argument("--location", default="Paris")
+    parser.add_argument("--country", default="Fr")
+    parser.add_argument("--timezone", type=int, default=2)
+    parser.add_argument("--other", action="append", default=[], type=parse_location, metavar="NAME,COUNTRY,LAT,LONG",
+                        help="other weather location (LOCATIONS of common_badger.py), repeated for each one")
+    parser.add_argument("--icons", default=".", help="directory with wicons/, windir/ and astricons/")
+    parser.add_argument("--fonts", help="directory with bitmap6.pil and bitmap8.pil")
+    parser.add_argument("--locale-dir", default=LOCALE_DIR, help="directory with the locale resource files")
+    config = parser.parse_args()
+
+    FrameHandler.server_frames = FrameServer(config)
+    server = ThreadingHTTPServer(("", config.port), FrameHandler)
+    print("Serving frames on port %s" % (config.port))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
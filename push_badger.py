@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                push_badger.py                     #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Listener for the updates pushed by the local Pi while the Badger 2040 is awake:
+- UDP datagrams sent from PI_HOST to PUSH_PORT, carrying only the changed fields as data lines (see data_badger.py)
+- each line goes straight into the data store of the page, which tells which tab shows it
+- the Badger stays awake PUSH_AWAKE seconds after the last button press or update, then halts
+
+"""
+
+import socket
+from time import ticks_ms, ticks_diff, sleep_ms
+import badger2040w as badger2040
+
+from common_badger import *
+from stats_badger import stats_request
+
+
+PUSH_AWAKE = 120        # Seconds listening for updates before halting (0 to halt straight away)
+PUSH_SIZE = 512         # Max size of an update datagram
+
+BUTTONS = (badger2040.BUTTON_A, badger2040.BUTTON_B, badger2040.BUTTON_C,
+           badger2040.BUTTON_UP, badger2040.BUTTON_DOWN)
+
+push_socket = None
+
+
+def push_open():
+    '''Opens the UDP socket receiving the pushed updates'''
+
+    global push_socket
+
+    if push_socket is None:
+        try:
+            push_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            push_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            push_socket.bind(socket.getaddrinfo("0.0.0.0", PUSH_PORT)[0][-1])
+            push_socket.settimeout(0)
+        except Exception as e:
+            print_debug("Cannot listen to pushed updates: %s" % (e))
+            push_socket = None
+    return push_socket
+
+
+def push_listen(display, read_line):
+    '''Listens to pushed updates until a button is pressed, returns the tabs updated (None if nothing happened while awake)'''
+
+    s = push_open() if PUSH_AWAKE else None
+    if s is None:
+        return None
+
+    t_start = ticks_ms()
+    while ticks_diff(ticks_ms(), t_start) < PUSH_AWAKE * 1000:
+        for button in BUTTONS:
+            if display.pressed(button):
+                return set()
+        try:
+            update, address = s.recvfrom(PUSH_SIZE)
+        except OSError:
+            sleep_ms(50)
+            continue
+        if address[0] != PI_HOST:
+            print_debug("Update ignored from %s" % (address[0]))
+            continue
+
+        stats_request("push", len(update))
+        dirty = set()
+        for line in update.decode().split('\n'):
+            t = read_line(line)
+            if t is not None:
+                dirty.add(t)
+        print_debug("Update received for tabs %s" % (dirty))
+        if dirty:
+            return dirty
+    return None
+
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                sources_badger.py                  #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Data sources of the pages of the Badger 2040, with no side effect so that any page can import them:
+- URL of each source, and its key in the cache of prefetched data
+- sources fetched by each page at refresh, prefetched while idle on another page (see prefetch in loop_badger.py)
+- key of the days of ephemeris kept in the store (see store_badger.py), not fetched again while stored
+
+"""
+
+from common_badger import *
+from store_badger import store_time
+
+
+EPHEM_URL = "https://vo.imcce.fr/webservices/miriade/rts_query.php?-mime=text&-ep=%s&-nbd=%s&-step=1d&-body=2,4,5,6,10,11&-long=%s&-lat=%s"
+EPHEM_DAYS = 7      # Days of ephemeris fetched in one request
+MOON_URL = "https://vo.imcce.fr/webservices/miriade/ephemcc_query.php?-mime=json&-ep=%s-%s&-name=s:moon"
+ISS_URL = 'http://api.open-notify.org/iss-now.json'
+
+OPENWEATHER_ID = "OPENWEATHER_ID"
+OPENWEATHER_FOR = "http://api.openweathermap.org/data/2.5/forecast?q=%s&units=metric&appid=%s"
+OPENWEATHER_WEA = "http://api.openweathermap.org/data/2.5/weather?q=%s&units=metric&appid=%s"
+OPENWEATHER_GROUP = "http://api.openweathermap.org/data/2.5/group?id=%s&units=metric&appid=%s"
+OPENWEATHER_ONE = "http://api.openweathermap.org/data/3.0/onecall?lat=%s&lon=%s&exclude=minutely,alerts&units=metric&appid=%s"
+
+DATA_URL = "http://%s:%s/badger" % (PI_HOST, PI_PORT)
+
+
+#-------------------------------------------------
+#        Sources: (cache key, URL)
+#-------------------------------------------------
+
+def ephem_source(date):
+    '''Planets rise and set times of the EPHEM_DAYS days from date'''
+
+    return "ephem_" + date, EPHEM_URL % (date, EPHEM_DAYS, LONG, LAT)
+
+
+def ephem_day_key(date):
+    '''Key of the ephemeris of date in the store'''
+
+    return "ephem_day_" + date
+
+
+def moon_source(current, next_day=False):
+    '''Moon position and phase now, or tomorrow at the same time'''
+
+    date = current["date_ymd1"] if next_day else current["date_ymd"]
+    return "moon_" + date, MOON_URL % (date, current["time_hm"])
+
+
+def weather_one_source(location):
+    '''Current weather and forecast of location (One Call)'''
+
+    return "one_" + location[0], OPENWEATHER_ONE % (location[2], location[3], OPENWEATHER_ID)
+
+
+def weather_group_source(locations):
+    '''Current weather of the locations (batched)'''
+
+    ids = ','.join([str(location[4]) for location in locations])
+    return "group_" + ids.replace(',', '_'), OPENWEATHER_GROUP % (ids, OPENWEATHER_ID)
+
+
+def weather_source(location):
+    '''Current weather of location'''
+
+    return "weather_" + location[0], OPENWEATHER_WEA % (location[0] + ',' + location[1], OPENWEATHER_ID)
+
+
+def forecast_source(location):
+    '''5 day forecast of location'''
+
+    return "forecast_" + location[0], OPENWEATHER_FOR % (location[0] + ',' + location[1], OPENWEATHER_ID)
+
+
+def data_source():
+    '''Local data served by the local Pi'''
+
+    return "data", DATA_URL
+
+
+def page_sources(page, current):
+    '''Returns the sources fetched by page at refresh, the ones worth prefetching first'''
+
+    if page == "astro":
+        sources = [moon_source(current), moon_source(current, True)]
+        if store_time(ephem_day_key(current["date_ymd"])) is None:
+            sources.insert(0, ephem_source(current["date_ymd"]))
+        return sources
+    if page == "weather":
+        sources = [weather_one_source(LOCATIONS[0])]
+        if len(LOCATIONS) > 1:
+            sources.append(weather_group_source(LOCATIONS[1:]))
+        for location in LOCATIONS[1:]:
+            sources.append(forecast_source(location))
+        return sources
+    if page == "data":
+        return [data_source()]
+    return []
+
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
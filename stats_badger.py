@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                stats_badger.py                    #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Energy and I/O usage counters of the Badger 2040, kept on flash (badger_os state "stats"):
+- wakes, awake time (total and last wake) and WiFi on time
+- requests and bytes downloaded per source (URL without its query)
+- full and partial e-ink updates per page, and updates skipped as the frame was already shown
+- JPEG decodes
+- HTTPS connections: opened (full TLS handshake) and kept alive
+
+Counters are updated in memory by the fetch, render and page loop code, and saved once per wake, just before halt
+Read them on the Stats tab of the data page, or from the REPL with stats_print(); reset them with stats_reset()
+
+"""
+
+import badger_os
+from time import ticks_ms, ticks_diff, time
+
+
+SOURCES_MAX = 16    # Number of sources counted, the others are counted as "other"
+
+stats = {
+    "since": 0,         # UTC of the last reset
+    "wakes": 0,
+    "awake_ms": 0,
+    "awake_last": 0,    # Awake time of the last wake (ms)
+    "wifi_ms": 0,
+    "sources": {},      # Source: [requests, bytes]
+    "updates": {},      # Page: [full updates, partial updates]
+    "skipped": {},      # Page: updates skipped
+    "jpeg": 0,
+    "https": [0, 0]     # HTTPS connections opened (full TLS handshake), kept alive
+}
+badger_os.state_load("stats", stats)
+
+stats_state = {
+    "page": "boot",
+    "wake": 0,          # ticks_ms at the start of the wake
+    "saved": 0,         # ticks_ms at the last save
+    "wifi": None        # ticks_ms at the last save while WiFi is on, None if off
+}
+
+
+#-------------------------------------------------
+#        Counting functions
+#-------------------------------------------------
+
+def stats_wake():
+    '''Counts a new wake'''
+
+    now = ticks_ms()
+    stats["wakes"] += 1
+    stats_state["wake"] = now
+    stats_state["saved"] = now
+    return
+
+
+def stats_page(page):
+    '''Sets the page the following updates are counted for'''
+
+    stats_state["page"] = page
+    return
+
+
+def stats_wifi(on=True):
+    '''Counts the WiFi on time from now on (until off), called when connecting and when halting'''
+
+    stats_count_time()
+    stats_state["wifi"] = ticks_ms() if on else None
+    return
+
+
+def stats_request(url, size):
+    '''Counts a request of size bytes to url'''
+
+    source = url.split('?')[0].split('://')[-1]
+    sources = stats["sources"]
+    if source not in sources and len(sources) >= SOURCES_MAX:
+        source = "other"
+    count = sources.setdefault(source, [0, 0])
+    count[0] += 1
+    count[1] += size
+    return
+
+
+def stats_update(partial=False):
+    '''Counts a full or partial e-ink update of the current page'''
+
+    count = stats["updates"].setdefault(stats_state["page"], [0, 0])
+    count[1 if partial else 0] += 1
+    return
+
+
+def stats_skip():
+    '''Counts an e-ink update of the current page skipped as unchanged'''
+
+    page = stats_state["page"]
+    stats["skipped"][page] = stats["skipped"].get(page, 0) + 1
+    return
+
+
+def stats_https(kind):
+    '''Counts an HTTPS connection "opened" or "kept" alive'''
+
+    stats["https"][("opened", "kept").index(kind)] += 1
+    return
+
+
+def stats_jpeg(n=1):
+    '''Counts n JPEG decodes'''
+
+    stats["jpeg"] += n
+    return
+
+
+#-------------------------------------------------
+#        Saving functions
+#-------------------------------------------------
+
+def stats_count_time():
+    '''Adds the awake and WiFi on time elapsed since the last save'''
+
+    now = ticks_ms()
+    stats["awake_ms"] += ticks_diff(now, stats_state["saved"])
+    stats["awake_last"] = ticks_diff(now, stats_state["wake"])
+    stats_state["saved"] = now
+    if stats_state["wifi"] is not None:
+        stats["wifi_ms"] += ticks_diff(now, stats_state["wifi"])
+        stats_state["wifi"] = now
+    return
+
+
+def stats_save():
+    '''Saves the counters on flash'''
+
+    stats_count_time()
+    badger_os.state_save("stats", stats)
+    return
+
+
+def stats_halt(display):
+    '''Saves the counters and halts (switches off on battery, radio included), counting a new wake when halt returns
+    (on USB, the WiFi time is counted again while still connected)'''
+
+    stats_wifi(False)
+    stats_save()
+    display.halt()
+    stats_wake()
+    if display.isconnected():
+        stats_wifi()
+    return
+
+
+def stats_reset():
+    '''Resets all the counters'''
+
+    stats.update({
+        "since": time(),
+        "wakes": 1,
+        "awake_ms": 0,
+        "awake_last": 0,
+        "wifi_ms": 0,
+        "sources": {},
+        "updates": {},
+        "skipped": {},
+        "jpeg": 0,
+        "https": [0, 0]
+    })
+    stats_state["wake"] = stats_state["saved"] = ticks_ms()
+    if stats_state["wifi"] is not None:
+        stats_state["wifi"] = stats_state["saved"]
+    badger_os.state_save("stats", stats)
+    return
+
+
+#-------------------------------------------------
+#        Reading functions
+#-------------------------------------------------
+
+def stats_lines():
+    '''Returns the counters as text lines'''
+
+    stats_count_time()
+    wakes = max(stats["wakes"], 1)
+    requests = sum(count[0] for count in stats["sources"].values())
+    size = sum(count[1] for count in stats["sources"].values())
+    lines = [
+        "Wakes %s, awake %0.1fs/wake (last %0.1fs)" % (stats["wakes"], stats["awake_ms"] / wakes / 1000, stats["awake_last"] / 1000),
+        "WiFi %0.1fs/wake, %s req, %0.1f kB" % (stats["wifi_ms"] / wakes / 1000, requests, size / 1024),
+        "Updates %s" % (", ".join("%s %s+%s" % (page, count[0], count[1]) for page, count in stats["updates"].items())),
+        "Skipped %s" % (", ".join("%s %s" % (page, n) for page, n in stats["skipped"].items())),
+        "JPEG decodes %s" % (stats["jpeg"]),
+        "HTTPS opened %s, kept %s" % tuple(stats["https"])
+    ]
+    for source, count in stats["sources"].items():
+        lines.append("%s: %s req, %0.1f kB" % (source, count[0], count[1] / 1024))
+    return lines
+
+
+def stats_print():
+    '''Prints the counters (from the REPL)'''
+
+    for line in stats_lines():
+        print(line)
+    return
+
+
+# Each boot is a wake (halt switches off on battery)
+stats_wake()
+stats_state["wake"] = stats_state["saved"] = 0
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
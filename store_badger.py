@@ -0,0 +1,286 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                store_badger.py                    #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Key-value store of the Badger 2040, kept on flash as a log of records (STORE_FILE), shared by the caches:
+- writing a key appends a record (header, key, value), deleting it appends a header with no value, so that flash
+  is written sequentially and a key is never rewritten in place
+- the position of the last record of each key is kept in an index in RAM, rebuilt at boot by one sequential scan
+  of the record headers: reading a value is one seek and one read
+- each record holds the CRC32 of its key and value, checked when the value is read (and for the last record at
+  boot, the only one a power loss may have cut)
+- once the log exceeds STORE_MAX, it is compacted: the last record of each key is copied to a new log, dropping
+  the oldest ones beyond STORE_KEEP, so that the size of the store stays bounded
+- the store, and every other access to the filesystem or to the display, is done holding io_lock: littlefs and the
+  frame buffer are not safe to use from both cores at once (see DUAL_CORE in common_badger.py)
+
+"""
+
+import os
+import struct
+import _thread
+import ubinascii
+from time import time
+
+
+STORE_FILE = "/store.log"
+STORE_MAX = 131072          # Size of the log triggering a compaction
+STORE_KEEP = 65536          # Size of the records kept by a compaction, the oldest ones are dropped beyond
+STORE_FMT = "<HIII"         # Key length, value length (STORE_DELETED for a deleted key), time, CRC32 of key and value
+STORE_HEAD = struct.calcsize(STORE_FMT)
+STORE_DELETED = 0xFFFFFFFF
+STORE_KEY_MAX = 64          # Longest key, longer ones mean a corrupted log
+STORE_CHUNK = 512           # Size of the chunks read to check or copy a value
+
+store_index = {}            # Key: [position of its last record, key length, value length, time, CRC32]
+store_state = {
+    "size": 0               # Size of the log
+}
+
+
+class IOLock:
+    '''Lock taken again with no deadlock by the core holding it (nested accesses to the filesystem or to the display)'''
+
+    def __init__(self):
+        self.lock = _thread.allocate_lock()
+        self.owner = None
+        self.depth = 0
+
+    def acquire(self):
+        me = _thread.get_ident()
+        if self.owner != me:
+            self.lock.acquire()
+            self.owner = me
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if not self.depth:
+            self.owner = None
+            self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+io_lock = IOLock()      # Held by each core for any access to the filesystem or to the display
+
+
+#-------------------------------------------------
+#        Log functions
+#-------------------------------------------------
+
+def store_crc(key, values):
+    '''Returns the CRC32 of the key and of the values following it'''
+
+    crc = ubinascii.crc32(key)
+    for value in values:
+        crc = ubinascii.crc32(value, crc)
+    return crc
+
+
+def store_check(f, entry, key):
+    '''Returns whether the value of the index entry of key read from f matches its CRC32'''
+
+    pos, klen, vlen, t, crc = entry
+    f.seek(pos + STORE_HEAD + klen)
+    chunk = memoryview(bytearray(STORE_CHUNK))
+    crc_read = ubinascii.crc32(key)
+    while vlen:
+        n = f.readinto(chunk[:min(vlen, STORE_CHUNK)])
+        if not n:
+            return False
+        crc_read = ubinascii.crc32(chunk[:n], crc_read)
+        vlen -= n
+    return crc_read == crc
+
+
+def store_open():
+    '''Rebuilds the index by one sequential scan of the record headers, compacting the log if its end is corrupted'''
+
+    store_index.clear()
+    store_state["size"] = 0
+    try:
+        f = open(STORE_FILE, 'rb')
+    except OSError:
+        return
+    with f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+        pos = 0
+        last = None
+        while pos + STORE_HEAD <= size:
+            klen, vlen, t, crc = struct.unpack(STORE_FMT, f.read(STORE_HEAD))
+            deleted = vlen == STORE_DELETED
+            end = pos + STORE_HEAD + klen + (0 if deleted else vlen)
+            if klen > STORE_KEY_MAX or end > size:
+                break
+            try:
+                key = f.read(klen).decode()
+            except UnicodeError:
+                break
+            if deleted:
+                store_index.pop(key, None)
+                last = None
+            else:
+                store_index[key] = [pos, klen, vlen, t, crc]
+                last = key
+                f.seek(end)
+            pos = end
+        corrupted = pos < size
+        if last is not None and not store_check(f, store_index[last], last.encode()):
+            # Last record cut by a power loss while written
+            del store_index[last]
+            corrupted = True
+
+    store_state["size"] = size
+    if corrupted:
+        store_compact()
+    return
+
+
+def store_compact(keep=STORE_KEEP):
+    '''Rewrites the log with the last record of each key, the newest ones first up to keep bytes'''
+
+    with io_lock:
+        # Newest records first, then written back in their order
+        entries = sorted(store_index.items(), key=lambda item: -item[1][0])
+        kept = []
+        size = 0
+        for key, entry in entries:
+            size += STORE_HEAD + entry[1] + entry[2]
+            if size > keep:
+                break
+            kept.insert(0, (key, entry))
+
+        store_index.clear()
+        chunk = memoryview(bytearray(STORE_CHUNK))
+        tmp = STORE_FILE + ".tmp"
+        pos = 0
+        try:
+            src = open(STORE_FILE, 'rb')
+        except OSError:
+            kept = []
+            src = None
+        with open(tmp, 'wb') as dst:
+            for key, entry in kept:
+                n_left = STORE_HEAD + entry[1] + entry[2]
+                src.seek(entry[0])
+                entry[0] = pos
+                while n_left:
+                    n = src.readinto(chunk[:min(n_left, STORE_CHUNK)])
+                    dst.write(chunk[:n])
+                    n_left -= n
+                store_index[key] = entry
+                pos += STORE_HEAD + entry[1] + entry[2]
+        if src is not None:
+            src.close()
+        try:
+            os.rename(tmp, STORE_FILE)
+        except OSError:
+            # File systems not replacing the existing file
+            os.remove(STORE_FILE)
+            os.rename(tmp, STORE_FILE)
+        store_state["size"] = pos
+    return
+
+
+#-------------------------------------------------
+#        Store functions
+#-------------------------------------------------
+
+def store_put(key, *values, t=None):
+    '''Stores the values (concatenated) under key, with time t (now if None), returns False if too large to be kept'''
+
+    k = key.encode()
+    vlen = sum(len(value) for value in values)
+    length = STORE_HEAD + len(k) + vlen
+    if length > STORE_KEEP or len(k) > STORE_KEY_MAX:
+        return False
+    if t is None:
+        t = int(time())
+    crc = store_crc(k, values)
+
+    if store_state["size"] + length > STORE_MAX:
+        store_compact(STORE_KEEP - length)
+    with io_lock:
+        with open(STORE_FILE, 'ab') as f:
+            f.write(struct.pack(STORE_FMT, len(k), vlen, t, crc))
+            f.write(k)
+            for value in values:
+                f.write(value)
+        store_index[key] = [store_state["size"], len(k), vlen, t, crc]
+        store_state["size"] += length
+    return True
+
+
+def store_get(key, buf=None):
+    '''Returns a view on the value of key read into buf (a new buffer if None), None if missing, corrupted or larger than buf'''
+
+    with io_lock:
+        entry = store_index.get(key)
+        if entry is None:
+            return None
+        pos, klen, vlen, t, crc = entry
+        if buf is None:
+            buf = bytearray(vlen)
+        elif vlen > len(buf):
+            return None
+        value = memoryview(buf)[:vlen]
+        try:
+            with open(STORE_FILE, 'rb') as f:
+                f.seek(pos + STORE_HEAD + klen)
+                n = f.readinto(value)
+        except OSError:
+            n = -1
+    if n != vlen or store_crc(key.encode(), (value,)) != crc:
+        store_delete(key)
+        return None
+    return value
+
+
+def store_time(key):
+    '''Returns the time key was stored, None if missing'''
+
+    entry = store_index.get(key)
+    return None if entry is None else entry[3]
+
+
+def store_delete(key):
+    '''Deletes key'''
+
+    with io_lock:
+        entry = store_index.pop(key, None)
+        if entry is None:
+            return
+        k = key.encode()
+        with open(STORE_FILE, 'ab') as f:
+            f.write(struct.pack(STORE_FMT, len(k), STORE_DELETED, 0, 0))
+            f.write(k)
+        store_state["size"] += STORE_HEAD + len(k)
+    return
+
+
+def store_keys(prefix=''):
+    '''Returns the keys starting with prefix'''
+
+    return [key for key in store_index if key.startswith(prefix)]
+
+
+store_open()
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -0,0 +1,280 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#---------------------------------------------------#
+#                                                   #
+#                thin_badger.py                     #
+#                by N.MERCOUROFF, 2023              #
+#                                                   #
+#---------------------------------------------------#
+
+"""
+Python script displaying on Badger 2040 the astro and weather tabs pre-rendered by the local Pi (thin client mode):
+- downloads the packed 1-bit frame of the tab shown, only when its version changed
+- draws it as runs of black pixels, with no fetching, parsing or JPEG decoding of its own
+
+Requires
+- Local Pi running pi/frame_server.py
+- common_badger.py library of common functions and data
+- Set THIN_CLIENT = True, PI_HOST and FRAME_PORT in common_badger.py
+
+"""
+
+import badger2040w as badger2040
+import badger_os
+import urequests
+
+from common_badger import *
+from stats_badger import stats_page, stats_request, stats_halt
+from mem_badger import mem_register, mem_check, MEM_CACHE
+
+
+FRAME_URL = "http://%s:%s/frames/%s"
+FRAME_WIDTH = 296
+FRAME_HEIGHT = 128
+FRAME_ROW = FRAME_WIDTH // 8
+FRAME_SIZE = FRAME_ROW * FRAME_HEIGHT
+FRAME_CACHE_NB = 3      # Number of frames kept in memory
+
+thin_state = {
+    "page": "astro"
+}
+badger_os.state_load("thin", thin_state)
+page = thin_state["page"]
+
+tab = 0
+tab_nb = 1
+frames = {}
+
+# Frame buffers allocated once, reused as frames are evicted from the cache
+frame_bufs = [bytearray(FRAME_SIZE) for i in range(FRAME_CACHE_NB)]
+
+
+def frames_evict():
+    '''Frees the frame buffers but one when the heap runs low, the frames being downloaded again when shown'''
+
+    frames.clear()
+    del frame_bufs[1:]
+    return
+
+
+mem_register("frames", MEM_CACHE, FRAME_SIZE * FRAME_CACHE_NB, frames_evict)
+
+# Display Setup
+
+display = badger2040.Badger2040W()
+display.set_update_speed(2)
+
+
+#-------------------------------------------------
+#        Frame functions
+#-------------------------------------------------
+
+def get_tab_nb():
+    '''Gets from the local Pi the number of tabs of the page'''
+
+    global tab_nb
+
+    index = fetch_data_text(display, FRAME_URL % (PI_HOST, FRAME_PORT, page))
+    if index:
+        tab_nb = max(len(index.strip().split('\n')), 1)
+    return bool(index)
+
+
+def frame_buf(t):
+    '''Returns a frame buffer for tab t, evicting the oldest frame of the cache if none is free'''
+
+    if t in frames:
+        return frames.pop(t)[1]
+    if len(frames) >= len(frame_bufs):
+        return frames.pop(next(iter(frames)))[1]
+    for buf in frame_bufs:
+        for version, frame in frames.values():
+            if frame is buf:
+                break
+        else:
+            return buf
+
+
+def get_frame(t):
+    '''Gets the frame of tab t, downloaded only if its version changed'''
+
+    version, frame = frames.get(t, ('', None))
+    url = FRAME_URL % (PI_HOST, FRAME_PORT, page) + "/%s?v=%s" % (t, version)
+
+    print_entry("Fetching frame %s/%s..." % (page, t))
+    mem_check()
+    for i in range(TRY_NB):
+        try:
+            address_url, headers = dns_url(url)
+            r = urequests.get(address_url, headers=headers)
+            if r.status_code == 304:
+                r.close()
+                print_exit("...frame unchanged")
+                return frame
+            if r.status_code == 200:
+                new_version = r.headers.get("X-Frame-Version", '')
+                buf = frame_buf(t)
+                version, frame = '', None
+                # A full buffer is a complete frame
+                body = read_body(r.raw, buf)
+                r.close()
+                stats_request(url, FRAME_SIZE if body is None else len(body))
+                if body is None:
+                    frames[t] = (new_version, buf)
+                    print_exit("...frame fetched, version %s" % (new_version))
+                    return buf
+                url = FRAME_URL % (PI_HOST, FRAME_PORT, page) + "/%s?v=" % (t)
+                continue
+            r.close()
+        except Exception as e:
+            print_debug("Attempt %s to connect" % (i))
+            wifi_connect(display)
+    print_error("...error fetching frame")
+    return None
+
+
+def draw_frame(frame):
+    '''Draws the frame, one rectangle per run of black pixels'''
+
+    display.set_pen(15)
+    display.clear()
+    display.set_pen(0)
+
+    frame = memoryview(frame)
+    for y in range(FRAME_HEIGHT):
+        start = -1
+        x = 0
+        for b in frame[y * FRAME_ROW:(y + 1) * FRAME_ROW]:
+            if b == 0 or b == 0xFF:
+                # Whole byte white or black: only the end or the start of a run matters
+                if b == 0 and start >= 0:
+                    display.rectangle(start, y, x - start, 1)
+                    start = -1
+                elif b == 0xFF and start < 0:
+                    start = x
+                x += 8
+                continue
+            mask = 0x80
+            while mask:
+                if b & mask:
+                    if start < 0:
+                        start = x
+                elif start >= 0:
+                    display.rectangle(start, y, x - start, 1)
+                    start = -1
+                mask >>= 1
+                x += 1
+        if start >= 0:
+            display.rectangle(start, y, x - start, 1)
+    return
+
+
+def draw_thin_tab():
+    '''Displays the frame of the current tab'''
+
+    print_entry("Thin client display %s tab %s..." % (page, tab))
+
+    frame = get_frame(tab)
+    h = frame_hash("thin_" + page, tab, frame and frames[tab][0])
+    if frame:
+        draw_frame(frame)
+    else:
+        display_clear(display)
+        display_menu(display)
+        display.set_pen(0)
+        display.rectangle(0, 60, 296, 25)
+        display.set_pen(15)
+        display.text("Unable to reach local Pi!", 5, 65, 296, 1)
+        display.set_pen(0)
+    display_update(display, h)
+
+    print_exit("...thin client display completed")
+    return
+
+
+def set_page(new_page):
+    '''Switches to the tabs of new_page, kept for the next wake'''
+
+    global page, tab, frames
+
+    page = new_page
+    stats_page(page)
+    tab = 0
+    frames = {}
+    thin_state["page"] = page
+    badger_os.state_save("thin", thin_state)
+    return
+
+
+#-------------------------------------------------
+#        Main
+#-------------------------------------------------
+
+def thin():
+    '''Main loop to displays the pre-rendered tabs according to the key pressed'''
+
+    global tab
+
+    stats_page(page)
+    changed = False
+    renew = True
+
+    while True:
+
+        if renew:
+            print_entry("Collecting %s tabs..." % (page))
+            display.led(128)
+            get_tab_nb()
+            display.led(0)
+            renew = False
+            changed = True
+            print_exit("...%s tabs collected" % (page))
+
+        if changed:
+            print_entry("Displaying %s tab..." % (page))
+            draw_thin_tab()
+            changed = False
+            print_exit("...%s tab displayed" % (page))
+            print_entry("Waiting for key pressed...")
+
+        # Call halt in a loop, on battery this switches off power.
+        # On USB, the app will exit when A+C is pressed because the launcher picks that up.
+        stats_halt(display)
+
+        if display.pressed(badger2040.BUTTON_DOWN):
+            print_exit("...button down detected")
+            tab = (tab + 1) % tab_nb
+            changed = True
+
+        if display.pressed(badger2040.BUTTON_UP):
+            print_exit("...button up detected")
+            tab = (tab - 1) % tab_nb
+            changed = True
+
+        if display.pressed(badger2040.BUTTON_A):
+            print_exit("...button ASTRO detected")
+            if page != "astro":
+                set_page("astro")
+            renew = True
+
+        if display.pressed(badger2040.BUTTON_B):
+            print_exit("...button WEATHER detected")
+            if page != "weather":
+                set_page("weather")
+            renew = True
+
+        if display.pressed(badger2040.BUTTON_C):
+            print_exit("...button DATA detected")
+            launch_pages("data")
+
+
+# Start of the script
+print(">> START thin client <<")
+
+# Launch the loop
+thin()
+
+#-------------------------------------------------
+#----- FIN DU PROGRAMME --------------------------
+#-------------------------------------------------
@@ -12,15 +12,26 @@
 Python script to grab weather data and displays them on Badger 2040 : 
 - current weather condition
 - forecast for the next 4 days 
+- temperature and pressure trends over 24h and 7 days (last tab, home location only)
+for each location of LOCATIONS, one after the other
 
-Fetches info from openweathermap
+Fetches info from openweathermap, current weather and forecast of the home location in a single request when possible,
+and the current weather of all the other locations in a single batched request
 
 Requires 
 - Weather images in  /wicons/
+- Locale resource files in /locale/
 - Wind direction images in /windir/
 - common_badger.py library of common functions and data
-- Fill up OPENWEATHER_ID
-- Set LAT, LONG, LOCATION, COUNTRY and TIMEZONE in common_badger.py
+- clock_badger.py clock service
+- calc_badger.py helpers compiled to native code
+- history_badger.py weather history log (kept in /weather_history.bin), imported when recording or drawing the trends
+- push_badger.py listener for the updates pushed by the local Pi, as lines of ';' separated fields:
+    W;<utc>;<temp °C>;<wind m/s>;<wind deg>;<icon>;<pressure hPa>;<humidity %>  current weather
+    F;<utc>;<temp °C>;<wind m/s>;<wind deg>;<icon>                              forecast
+- sources_badger.py URLs of the data sources
+- Fill up OPENWEATHER_ID in sources_badger.py
+- Set LAT, LONG, LOCATION, COUNTRY, LOCATIONS and TIMEZONE in common_badger.py
 
 """
 
@@ -29,107 +40,32 @@ import jpegdec
 from time import localtime
 
 from common_badger import *
+from clock_badger import local_time
+from sources_badger import weather_one_source, weather_group_source, weather_source, forecast_source
+from stats_badger import stats_jpeg, stats_halt
+from loop_badger import run_page, ready, data_lock
+from calc_badger import bearing_index, utc_hour
 
 
 # VERBOSE = False
 
 FORECAST_NB = 4
-TAB_NB = FORECAST_NB + 1
+LOC_TAB_NB = FORECAST_NB + 2   # Current weather, forecast days and trends of a location
+TAB_NB = LOC_TAB_NB * len(LOCATIONS)
 tab = 0  # Let's start with "Current weather" tab !
 
-OPENWEATHER_ID = "OPENWEATHER_ID"
-OPENWEATHER_FOR = "http://api.openweathermap.org/data/2.5/forecast?q=%s&units=metric&appid=%s"
-OPENWEATHER_WEA = "http://api.openweathermap.org/data/2.5/weather?q=%s&units=metric&appid=%s"
+FORECAST_HOURS = ('09', '12', '18')
+FORECAST_HOURS_NB = tuple([int(hr) for hr in FORECAST_HOURS])
+DAILY_TEMPS = (('09', 'morn'), ('12', 'day'), ('18', 'eve'))
 
 WICONDIR = "/wicons/"
 WINDCONDIR = "/windir/"
 
-icon_mapping = {
-    "01d": "icon-sun.jpg",
-    "01n": "icon-sun.jpg",
-    "02d": "icon-few-cloud.jpg",
-    "02n": "icon-few-cloud.jpg",
-    "03d": "icon-clouds.jpg",
-    "03n": "icon-clouds.jpg",
-    "04d": "icon-clouds.jpg",
-    "04n": "icon-clouds.jpg",
-    "09d": "icon-rain.jpg",
-    "09n": "icon-rain.jpg",
-    "10d": "icon-rain.jpg",
-    "10n": "icon-rain.jpg",
-    "11d": "icon-storm.jpg",
-    "11n": "icon-storm.jpg",
-    "13d": "icon-snow.jpg",
-    "13n": "icon-snow.jpg",
-    "50d": "icon-myst.jpg",
-    "50n": "icon-myst.jpg"
-}
-
-icon_sm_mapping = {
-    "01d": "icon-sm-sun.jpg",
-    "01n": "icon-sm-sun.jpg",
-    "02d": "icon-sm-few-cloud.jpg",
-    "02n": "icon-sm-few-cloud.jpg",
-    "03d": "icon-sm-clouds.jpg",
-    "03n": "icon-sm-clouds.jpg",
-    "04d": "icon-sm-clouds.jpg",
-    "04n": "icon-sm-clouds.jpg",
-    "09d": "icon-sm-rain.jpg",
-    "09n": "icon-sm-rain.jpg",
-    "10d": "icon-sm-rain.jpg",
-    "10n": "icon-sm-rain.jpg",
-    "11d": "icon-sm-storm.jpg",
-    "11n": "icon-sm-storm.jpg",
-    "13d": "icon-sm-snow.jpg",
-    "13n": "icon-sm-snow.jpg",
-    "50d": "icon-sm-myst.jpg",
-    "50n": "icon-sm-myst.jpg"
-}
-
-if COUNTRY == "Fr":
-    WEATHER_CODE_MAPPING = {
-        "01d": "Soleil",
-        "01n": "Nuit claire",
-        "02d": "Partiellement nuageux",
-        "02n": "Partiellement nuageux",
-        "03d": "Nuages épars",
-        "03n": "Nuages épars",
-        "04d": "Quelques nuages",
-        "04n": "Quelques nuages",
-        "09d": "Averses",
-        "09n": "Averses",
-        "10d": "Pluie",
-        "10n": "Pluie",
-        "11d": "Orage",
-        "11n": "Orage",
-        "13d": "Neige",
-        "13n": "Neige",
-        "50d": "Brouillard ",
-        "50n": "Brouillard "
-    }
-    TAB_NAMES = ["Météo", "Prévisions"]
-else:
-    WEATHER_CODE_MAPPING = {
-        "01d":	"clear sky",
-        "01n":	"clear sky",
-        "02d":	"few clouds",
-        "02n":	"few clouds",
-        "03d":	"scattered clouds",
-        "03n":	"scattered clouds",
-        "04d":	"broken clouds",
-        "04n":	"broken clouds",
-        "09d":	"shower rain",
-        "09n":	"shower rain",
-        "10d":	"rain",
-        "10n":	"rain",
-        "11d":	"thunderstorm",
-        "11n":	"thunderstorm",
-        "13d":	"snow",
-        "13n":	"snow",
-        "50d":	"mist ",
-        "50n":	"mist "
-    }
-    TAB_NAMES = ["Weather", "Forecast"]
+# Open Weather Map condition codes (with no day or night suffix), their icon and their name in the locale table
+WEATHER_CODES = ("01", "02", "03", "04", "09", "10", "11", "13", "50")
+WEATHER_ICONS = ("sun", "few-cloud", "clouds", "clouds", "rain", "rain", "storm", "snow", "myst")
+
+TREND_SPANS = (86400, 7 * 86400)    # Spans of the trends, named in the locale table
 
 
 dirs = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
@@ -146,58 +82,91 @@ display.set_update_speed(2)
 #		Weather functions
 #-------------------------------------------------
 
+HOME = LOCATIONS[0][0]
+
+combined_ok = True
+weather_ok = {}
+forecast_ok = {}
+
+# Weather and forecast stores, keyed by location name
 forecast_data = {}
-weather_data = {
-    'weekday': '',
-    'nameday': '?',
-    'utc': 0,
-    'time': '?',
-    'temp': '?',
-    'condition_code': '?',
-    'condition_name': '?'
-}
+weather_data = {}
+for location in LOCATIONS:
+    forecast_data[location[0]] = {}
+    weather_data[location[0]] = {
+        'weekday': '',
+        'nameday': '?',
+        'utc': 0,
+        'time': '?',
+        'temp': '?',
+        'condition_code': '?',
+        'condition_name': '?'
+    }
+
+
+def weather_icon(code, small=False):
+    '''Returns the icon file of the condition code'''
+
+    icon = WEATHER_ICONS[WEATHER_CODES.index(code[:2])]
+    return WICONDIR + ("icon-sm-%s.jpg" if small else "icon-%s.jpg") % (icon)
+
+
+def condition_name(code):
+    '''Returns the name of the condition code in the active locale'''
+
+    texts = locale("weather")
+    if code[2:] == 'n' and code[:2] in texts["night"]:
+        return texts["night"][code[:2]]
+    return texts["conditions"][WEATHER_CODES.index(code[:2])]
 
 
 def calculate_bearing(d):
     '''Calculates a compass direction from the wind direction in degrees'''
 
-    ix = round(d / (360. / len(dirs)))
-    return dirs[ix % len(dirs)]
-
+    return dirs[bearing_index(int(d * len(dirs)), len(dirs))]
 
-def get_weather_data():
-    '''Fetches weather data from Open Weather Map'''
 
-    global weather_data
+def read_conditions(temp, wind, deg, weather):
+    '''Parses the temperature, wind and weather condition of an Open Weather Map entry'''
 
-    print_entry("Reading weather data...")
+    try:
+        temp = float(temp)
+    except:
+        temp = 0.
+    try:
+        wind = float(wind) * 3.6
+    except:
+        wind = 0.
+    try:
+        wind_dir = calculate_bearing(deg)
+    except:
+        wind_dir = '?'
+    try:
+        code = weather[0]["icon"]
+        weather_name = condition_name(code)
+    except:
+        code = '?'
+        weather_name = '?'
+    return temp, wind, wind_dir, code, weather_name
 
-    weather_json = fetch_data_json(display, OPENWEATHER_WEA % (LOCATION + ',' + COUNTRY, OPENWEATHER_ID))
-        
-    if not weather_json:
-        print_error("...error: cannot read weather")
-        return False
-    
-    print_debug(weather_json)
-    print_exit("...success reading weather data")
 
-    # parse relevant data from JSON
+def read_weather(name, utc, temp, wind, deg, weather, pressure, humidity):
+    '''Parses the current weather conditions of location name into weather_data'''
 
-    print_entry("Parsing weather data...")
-    utc = 0
-    print_debug('weather_json["dt"]= %s' % (weather_json["dt"]))
+    print_entry("Parsing weather data of %s..." % (name))
+    print_debug('weather utc = %s' % (utc))
 
     try:
         try:
 
-            utc = int(weather_json["dt"])
+            utc = int(utc)
 
-            dt = localtime(utc)
+            dt = local_time(utc)
             
             wd = int(dt[6])
-            hr = '{:02d}:{:02d}'.format(dt[3] + TIMEZONE, dt[4])
+            hr = '{:02d}:{:02d}'.format(dt[3], dt[4])
             
-            wd_name = WEEKDAYS[wd]
+            wd_name = locale("common")["weekdays"][wd]
 
         except:
             utc = 0
@@ -207,37 +176,29 @@ def get_weather_data():
 
         print_debug("UTC = %s, WD = %s, hr = %s" %(utc, wd_name, hr))
 
+        temp, wind, wind_dir, code_current, weather_name = read_conditions(temp, wind, deg, weather)
         try:
-            temp = float(weather_json["main"]["temp"])
-        except:
-            temp = 0.
-        try:
-            wind = float(weather_json["wind"]["speed"]) * 3.6
-        except:
-            wind = 0.
-        try:
-            wind_dir = calculate_bearing(weather_json["wind"]["deg"])
+            pressure = float(pressure)
+            humidity = int(humidity)
         except:
-            wind_dir = '?'
-        try:
-            code_current = weather_json["weather"][0]["icon"]
-            weather_name = WEATHER_CODE_MAPPING[code_current]
-        except:
-            code_current = '?'
-            weather_name = '?'
+            pressure = 0.
+            humidity = 0
 
         print_debug("%s@%s, %0.0f°C, %0.0fkm/h, %s, %s" %
                   (wd_name, hr, temp, wind, wind_dir, weather_name))
-        weather_data['utc'] = utc
-        weather_data['time'] = hr
-        weather_data['weekday'] = wd
-        weather_data['nameday'] = wd_name
-
-        weather_data['temp'] = temp
-        weather_data['wind'] = wind
-        weather_data['wind_dir'] = wind_dir
-        weather_data['condition_code'] = code_current
-        weather_data['condition_name'] = weather_name
+        weather_data[name] = {
+            'utc': utc,
+            'time': hr,
+            'weekday': wd,
+            'nameday': wd_name,
+            'temp': temp,
+            'wind': wind,
+            'wind_dir': wind_dir,
+            'pressure': pressure,
+            'humidity': humidity,
+            'condition_code': code_current,
+            'condition_name': weather_name
+        }
         print_exit("...success parsing weather info")
         return True
 
@@ -246,13 +207,136 @@ def get_weather_data():
         return False
 
 
-def get_forecast():
-    '''Fetches forecast data from Open Weather Map'''
+def read_forecast(name, utc, temp, wind, deg, weather, replace=False):
+    '''Stores a forecast entry of location name into forecast_data for the day of utc (only FORECAST_HOURS are kept), returns its day (None if not kept)'''
+
+    forecast = forecast_data[name]
+    try:
+        utc = int(utc)
+    except:
+        return None
+    # Entries of the other hours dropped before any conversion
+    if utc_hour(utc) not in FORECAST_HOURS_NB:
+        return None
+    dt = localtime(utc)
+    hr = '{:02d}'.format(dt[3])
+
+    wd = int(dt[6])
+    for day_num in range(len(forecast)):
+        if forecast[day_num]['weekday'] == wd:
+            break
+    else:
+        day_num = len(forecast)
+        if day_num >= FORECAST_NB:
+            return None
+        try:
+            wd_name = locale("common")["weekdays"][wd]
+        except:
+            wd_name = ''
+        forecast[day_num] = {
+            'weekday': wd,
+            'nameday': wd_name,
+            'hours': {}
+        }
+    if hr in forecast[day_num]['hours'] and not replace:
+        return None
+
+    temp, wind, wind_dir, code, weather_name = read_conditions(temp, wind, deg, weather)
+    time = '{:02d}:{:02d}'.format(dt[3], dt[4])
+    print_debug("Forecast for day %s@%s: %s°C, %skm/h %s, %s" %
+                (day_num, time, temp, wind, wind_dir, weather_name))
+
+    forecast[day_num]['hours'][hr] = {
+        'time': time,
+        'temp': temp,
+        'wind': wind,
+        'wind_dir': wind_dir,
+        'condition_code': code,
+        'condition_name': weather_name
+    }
+    return day_num
 
-    global forecast_data
 
-    print_entry("Reading forecast data...")
-    weather_forecast = fetch_data_json(display, OPENWEATHER_FOR % (LOCATION + ',' + COUNTRY, OPENWEATHER_ID))
+def read_weather_line(line):
+    '''Parses a weather line of the home location pushed by the local Pi, returns the tab showing it (None if not parsed)'''
+
+    fields = line.strip().split(';')
+    try:
+        if fields[0] == 'W' and read_weather(HOME, fields[1], fields[2], fields[3], fields[4],
+                                             [{"icon": fields[5]}], fields[6], fields[7]):
+            from history_badger import history_record
+            history_record(weather_data[HOME])
+            return 0
+        if fields[0] == 'F':
+            day_num = read_forecast(HOME, fields[1], fields[2], fields[3], fields[4],
+                                    [{"icon": fields[5]}], True)
+            if day_num is not None:
+                return day_num + 1
+    except Exception as e:
+        print_debug("Cannot parse weather line %s: %s" % (line, e))
+    return None
+
+
+async def get_weather_data(location):
+    '''Fetches weather data of location from Open Weather Map'''
+
+    name = location[0]
+    print_entry("Reading weather data of %s..." % (name))
+
+    key, url = weather_source(location)
+    weather_json = await afetch_data_json(display, url, key)
+        
+    if not weather_json:
+        print_error("...error: cannot read weather")
+        return False
+    
+    print_debug(weather_json)
+    print_exit("...success reading weather data")
+
+    main = weather_json.get("main", {})
+    wind = weather_json.get("wind", {})
+    with data_lock:
+        return read_weather(name, weather_json.get("dt"), main.get("temp"),
+                            wind.get("speed"), wind.get("deg"), weather_json.get("weather"),
+                            main.get("pressure"), main.get("humidity"))
+
+
+async def get_weather_group(locations):
+    '''Fetches the current weather of all the locations from Open Weather Map in a single request'''
+
+    print_entry("Reading weather data of %s locations..." % (len(locations)))
+
+    names = {}
+    for location in locations:
+        names[location[4]] = location[0]
+    key, url = weather_group_source(locations)
+    group_json = await afetch_data_json(display, url, key)
+
+    if not group_json:
+        print_error("...error: cannot read weather of the locations")
+        return
+    print_exit("...success reading weather data of the locations")
+
+    with data_lock:
+        for weather_json in group_json.get("list", []):
+            name = names.get(weather_json.get("id"))
+            if name is None:
+                continue
+            main = weather_json.get("main", {})
+            wind = weather_json.get("wind", {})
+            weather_ok[name] = read_weather(name, weather_json.get("dt"), main.get("temp"),
+                                            wind.get("speed"), wind.get("deg"), weather_json.get("weather"),
+                                            main.get("pressure"), main.get("humidity"))
+    return
+
+
+async def get_forecast(location):
+    '''Fetches forecast data of location from Open Weather Map'''
+
+    name = location[0]
+    print_entry("Reading forecast data of %s..." % (name))
+    key, url = forecast_source(location)
+    weather_forecast = await afetch_data_json(display, url, key)
 
     if not weather_forecast:
         print_error("...error: cannot read forecast data")
@@ -260,95 +344,127 @@ def get_forecast():
     print_exit("...success reading forecast data")
 
     #----- Extracts weather forecast data
-    try:
-        forecast_list = weather_forecast["list"]
-
-        print_debug(forecast_list)
-
-        day_num = -1
-        wd = -1
-        wd_name = ''
-
-        for forecast in forecast_list:
-            try:
-                utc = int(forecast["dt"])
-                dt = localtime(utc)
-                wd_new = int(dt[6])
-                hr = '{:02d}'.format(dt[3])
-                time = '{:02d}:{:02d}'.format(dt[3], dt[4])
-            except:
-                utc = 0
-                wd_new = 0
-                hr = '00:00'
-            try:
-                temp = float(forecast["main"]["temp"])
-            except:
-                temp = 0.
-            try:
-                wind = float(forecast["wind"]["speed"]) * 3.6
-            except:
-                wind = 0.
-            try:
-                wind_dir = calculate_bearing(forecast["wind"]["deg"])
-            except:
-                wind_dir = '?'
-            try:
-                code = forecast["weather"][0]["icon"]
-                print_debug("Weather code %s" % (code))
-                weather_name = WEATHER_CODE_MAPPING[code]
-            except:
-                print_debug("Weather name unknown")
-                code = '?'
-                weather_name = '?'
-
-            if wd != wd_new:
-                wd = wd_new
-                
-                day_num += 1
-                try:
-                    wd_name = WEEKDAYS[wd]
-                except:
-                    wd_name = ''
-
-                forecast_data[day_num] = {
-                    'weekday': wd,
-                    'nameday': wd_name,
-                    'hours': {}
-                }
-            print_debug("Forecast for day %s@%s: %s°C, %skm/h %s, %s" %
-                        (day_num, time, temp, wind, wind_dir, weather_name))
-                                
-            forecast_data[day_num]['hours'][hr] = {
-                'time': time,
-                'temp': temp,
-                'wind': wind,
-                'wind_dir': wind_dir,
-                'condition_code': code,
-                'condition_name': weather_name
-            }
-
-            print_debug("%s@%s, %0.0f°C, %0.0fkm/h, %s, %s" %
-                    (wd_name, hr, temp, wind, wind_dir, weather_name))
+    with data_lock:
+        try:
+            forecast_list = weather_forecast["list"]
 
-        return True
+            print_debug(forecast_list)
+
+            forecast_data[name] = {}
+            for forecast in forecast_list:
+                main = forecast.get("main", {})
+                wind = forecast.get("wind", {})
+                read_forecast(name, forecast.get("dt"), main.get("temp"),
+                              wind.get("speed"), wind.get("deg"), forecast.get("weather"))
+
+            return True
     
-    except Exception as e:
-        print_error("...error reading forecast data: %s" % (e))
-        return False
+        except Exception as e:
+            print_error("...error reading forecast data: %s" % (e))
+            return False
+
+
+async def get_weather_combined(location):
+    '''Fetches weather and forecast data of location from Open Weather Map in a single request'''
+
+    global combined_ok
+
+    name = location[0]
+    one_weather_ok = False
+    one_forecast_ok = False
 
+    print_entry("Reading weather and forecast data of %s..." % (name))
+    key, url = weather_one_source(location)
+    combined_json = await afetch_data_json(display, url, key)
 
-def get_weather_forecast():
+    if not combined_json:
+        print_error("...error: cannot read weather and forecast data")
+        return one_weather_ok, one_forecast_ok
+    print_exit("...success reading weather and forecast data")
+
+    with data_lock:
+        try:
+            current_json = combined_json["current"]
+            one_weather_ok = read_weather(name, current_json.get("dt"), current_json.get("temp"),
+                                          current_json.get("wind_speed"), current_json.get("wind_deg"),
+                                          current_json.get("weather"),
+                                          current_json.get("pressure"), current_json.get("humidity"))
+        except Exception as e:
+            print_debug("No current weather in combined data: %s" % (e))
+
+        #----- Hourly forecast for the next 48h, then daily forecast (morning, day and evening temperatures)
+        try:
+            hourly_list = combined_json["hourly"]
+            daily_list = combined_json["daily"]
+
+            forecast_data[name] = {}
+            for forecast in hourly_list:
+                read_forecast(name, forecast.get("dt"), forecast.get("temp"),
+                              forecast.get("wind_speed"), forecast.get("wind_deg"), forecast.get("weather"))
+
+            utc_min = int(hourly_list[0]["dt"]) if hourly_list else 0
+            for forecast in daily_list:
+                day = int(forecast["dt"]) // 86400 * 86400
+                temps = forecast.get("temp", {})
+                for hr, key in DAILY_TEMPS:
+                    utc = day + int(hr) * 3600
+                    if utc >= utc_min:
+                        read_forecast(name, utc, temps.get(key),
+                                      forecast.get("wind_speed"), forecast.get("wind_deg"), forecast.get("weather"))
+            one_forecast_ok = True
+        except Exception as e:
+            print_debug("No forecast in combined data: %s" % (e))
+
+    # Combined request not available with this key: uses the separate requests from now on
+    if not one_weather_ok and not one_forecast_ok:
+        combined_ok = False
+    return one_weather_ok, one_forecast_ok
+
+
+def location_tabs(i, forecast=False):
+    '''Returns the tabs of location i showing the current weather (and trends), or the forecast'''
+
+    if forecast:
+        return range(i * LOC_TAB_NB + 1, (i + 1) * LOC_TAB_NB - 1)
+    return (i * LOC_TAB_NB, (i + 1) * LOC_TAB_NB - 1)
+
+
+async def get_weather_forecast(tab):
     """
-        Fetches forecast and weather data
+        Fetches weather and forecast data of all the locations, the location of tab first, each tab being handed off
+        to be drawn as soon as its data is parsed:
+        - current weather and forecast of the home location in a single request when possible
+        - current weather of the other locations in a single batched request
+        - forecast of the other locations, one request each
     """
 
-    global weather_ok, forecast_ok
-
-    display.led(128)
-    display_status(display, 'Fetching weather data')
-    weather_ok = get_weather_data()
-    forecast_ok= get_forecast()
-    display.led(0)
+    weather_ok.clear()
+    forecast_ok.clear()
+    shown = tab // LOC_TAB_NB
+    grouped = False
+    for i in [shown] + [i for i in range(len(LOCATIONS)) if i != shown]:
+        location = LOCATIONS[i]
+        name = location[0]
+        if i == 0 and combined_ok:
+            weather_ok[HOME], forecast_ok[HOME] = await get_weather_combined(location)
+
+        if not weather_ok.get(name) and not grouped:
+            # Current weather of the locations still missing (home once the combined request failed), batched
+            grouped = True
+            missing = [other for other in LOCATIONS
+                       if not weather_ok.get(other[0]) and (other[0] != HOME or HOME in weather_ok or not combined_ok)]
+            await get_weather_group(missing)
+            ready([t for j in range(len(LOCATIONS)) if weather_ok.get(LOCATIONS[j][0]) for t in location_tabs(j)])
+        if not weather_ok.get(name):
+            weather_ok[name] = await get_weather_data(location)
+        if i == 0 and weather_ok[HOME]:
+            from history_badger import history_record
+            history_record(weather_data[HOME])
+        ready(location_tabs(i))
+
+        if not forecast_ok.get(name):
+            forecast_ok[name] = await get_forecast(location)
+        ready(location_tabs(i, True))
     return
 
 
@@ -356,36 +472,40 @@ def get_weather_forecast():
 #		Display functions
 #-------------------------------------------------
 
-def display_current_weather():
-    '''Displays current weather information'''
+def display_current_weather(name):
+    '''Displays current weather information of location name'''
 
-    print_entry("Display current weather...")
+    print_entry("Display current weather of %s..." % (name))
 
     try:
+        weather = weather_data[name]
         # Draw the tab header
         display_title(display, "%s %s, %s %s" % (
-            TAB_NAMES[0], LOCATION, weather_data['nameday'], weather_data['time']))
+            locale("weather")["tabs"][0], name, weather['nameday'], weather['time']))
 
         display.set_font("bitmap8")
-        jpeg_file = WICONDIR + icon_mapping[weather_data['condition_code']]
+        jpeg_file = weather_icon(weather['condition_code'])
         print_debug("Opening %s" % (jpeg_file))
-        jpeg.open_file(jpeg_file)
+        jpeg_open(jpeg, jpeg_file)
         jpeg.decode(13, 30, jpegdec.JPEG_SCALE_FULL)
-        jpeg.open_file(WICONDIR + "icon-tn-wind.jpg")
+        stats_jpeg()
+        jpeg_open(jpeg, WICONDIR + "icon-tn-wind.jpg")
         jpeg.decode(98, 68, jpegdec.JPEG_SCALE_FULL)
+        stats_jpeg()
         display.set_pen(0)
-        display.text(weather_data['condition_name'],
+        display.text(weather['condition_name'],
                      int(296 / 3), 28, 296 - 105, 2)
         display.text("T°", int(296 / 3), 48, 296 - 105, 2)
-        display.text("%0.0f °C" % (weather_data['temp']),
+        display.text("%0.0f °C" % (weather['temp']),
                      int(296 / 3) + 60, 48, 296 - 105, 2)
         # display.text("Vent:", int(296 / 3), 68, 296 - 105, 2)
-        display.text("%0.0f km/h" % (weather_data['wind']),
+        display.text("%0.0f km/h" % (weather['wind']),
                      int(296 / 3) + 60, 68, 296 - 105, 2)
 
-        display.text(weather_data['wind_dir'], 188, 88, 296 - 105, 2)
-        jpeg.open_file(WINDCONDIR + weather_data['wind_dir'] + '.jpg')
+        display.text(weather['wind_dir'], 188, 88, 296 - 105, 2)
+        jpeg_open(jpeg, WINDCONDIR + weather['wind_dir'] + '.jpg')
         jpeg.decode(158, 88, jpegdec.JPEG_SCALE_FULL)
+        stats_jpeg()
         print_exit("...display weather completed")
     except Exception as e:
         display.set_pen(0)
@@ -396,17 +516,17 @@ def display_current_weather():
     return
 
 
-def display_forecast(day):
-    '''Displays forecast information'''
+def display_forecast(name, day):
+    '''Displays forecast information of location name'''
 
-    print_entry("Displaying forecast for day %s..." %(day))
+    print_entry("Displaying forecast of %s for day %s..." %(name, day))
 
     forecast_displayed = False
     try:
-        daily_forecast = forecast_data[day]
+        daily_forecast = forecast_data[name][day]
         # Draw the tab header
         display_title(display, "%s %s, %s" %
-                      (TAB_NAMES[1], LOCATION, forecast_data[day]['nameday']))
+                      (locale("weather")["tabs"][1], name, daily_forecast['nameday']))
         # display.update()
 
         display.set_font("bitmap8")
@@ -416,8 +536,9 @@ def display_forecast(day):
         display.line(26, 20, 26, 120)
         display.line(116, 20, 116, 120)
         display.line(206, 20, 206, 120)
-        jpeg.open_file(WICONDIR + "icon-tn-wind.jpg")
+        jpeg_open(jpeg, WICONDIR + "icon-tn-wind.jpg")
         jpeg.decode(0, 88, jpegdec.JPEG_SCALE_FULL)
+        stats_jpeg()
         display.set_pen(0)
         display.text("T°", 3, 60, 40, s)
 
@@ -442,8 +563,9 @@ def display_forecast(day):
             print_debug("Displaying forecast for %s : %s" %
                         (hr, daily_forecast_hr['condition_code']))
                 
-            jpeg.open_file(WICONDIR + icon_sm_mapping[daily_forecast_hr['condition_code']])
+            jpeg_open(jpeg, weather_icon(daily_forecast_hr['condition_code'], True))
             jpeg.decode(x_hr + 25, 20, jpegdec.JPEG_SCALE_FULL)
+            stats_jpeg()
 
             display.set_pen(0)
 
@@ -453,8 +575,9 @@ def display_forecast(day):
                         (daily_forecast_hr['wind']), x_hr+45, 80, s)
 
             display.text("%s" % (daily_forecast_hr['wind_dir']), x_hr+45, 100, x_hr + 100, s)
-            jpeg.open_file(WINDCONDIR + daily_forecast_hr['wind_dir'] + '.jpg')
+            jpeg_open(jpeg, WINDCONDIR + daily_forecast_hr['wind_dir'] + '.jpg')
             jpeg.decode(x_hr + 20, 98, jpegdec.JPEG_SCALE_FULL)
+            stats_jpeg()
 
         if forecast_displayed:
             print_exit("...display forecast completed")
@@ -470,22 +593,82 @@ def display_forecast(day):
     return forecast_displayed
 
 
+def display_trend():
+    '''Displays temperature and pressure trends of the home location over the TREND_SPANS from the weather history'''
+
+    print_entry("Displaying weather trends...")
+
+    utc_end = weather_data[HOME]['utc']
+    if not utc_end:
+        print_exit("...no weather trend to be displayed")
+        return False
+
+    from history_badger import history_read, display_sparkline
+    texts = locale("weather")
+    display_title(display, "%s %s" % (texts["tabs"][2], HOME))
+    display.set_font("bitmap6")
+    display.set_pen(0)
+    display.text("T°", 4, 44, 40, 2)
+    display.text("hPa", 4, 90, 40, 1)
+
+    trend_displayed = False
+    x = 36
+    for span_name, span in zip(texts["trends"], TREND_SPANS):
+        samples = history_read(utc_end, span)
+        temps = [sample[1] if sample else None for sample in samples]
+        pressures = [sample[2] if sample and sample[2] else None for sample in samples]
+
+        t_min, t_max = display_sparkline(display, temps, x, 34, 120, 28)
+        if t_min is not None:
+            display.text("%s: %0.0f/%0.0f °C" % (span_name, t_min, t_max), x, 24, 120, 1)
+            trend_displayed = True
+        p_min, p_max = display_sparkline(display, pressures, x, 80, 120, 28)
+        if p_min is not None:
+            display.text("%s: %0.0f/%0.0f hPa" % (span_name, p_min, p_max), x, 70, 120, 1)
+        x += 125
+
+    if trend_displayed:
+        print_exit("...display trends completed")
+    else:
+        print_exit("...no weather trend to be displayed")
+    return trend_displayed
+
+
 def display_weather(tab):
-    '''Displays either the current weather (tab = 0) or the forecast (tab > 0) information'''
+    '''Displays either the current weather (1st tab of a location), the forecast or the trends (last tab of the home location) information'''
 
-    if tab == 0:
-        display_current_weather()
+    name = LOCATIONS[tab // LOC_TAB_NB][0]
+    loc_tab = tab % LOC_TAB_NB
+    if loc_tab == 0:
+        display_current_weather(name)
         weather_displayed = True
+    elif loc_tab == LOC_TAB_NB - 1:
+        weather_displayed = name == HOME and display_trend()
     else:
-        weather_displayed = display_forecast(tab-1)
+        weather_displayed = display_forecast(name, loc_tab - 1)
     return weather_displayed
 
 
-def display_weather_tab():
-    '''Displays the current tab (unless forecast is empoty because we are the end of the day)'''
+def weather_content(t):
+    '''Returns the data shown on tab t'''
+
+    name = LOCATIONS[t // LOC_TAB_NB][0]
+    loc_tab = t % LOC_TAB_NB
+    if loc_tab == 0:
+        return weather_data.get(name)
+    if loc_tab == LOC_TAB_NB - 1:
+        return weather_data[HOME]['utc']
+    return forecast_data[name].get(loc_tab - 1)
+
+
+def display_weather_tab(t):
+    '''Displays tab t (unless forecast is empoty because we are the end of the day), returns the tab displayed'''
 
     global tab
 
+    # Tabs that cannot be displayed are skipped in the direction of the navigation
+    step = -1 if (tab - t) % TAB_NB == 1 else 1
+    tab = t
     weather_displayed = False
 
     display_clear(display)
@@ -498,74 +681,39 @@ def display_weather_tab():
         weather_displayed = display_weather(tab)
         if not weather_displayed:
             print_exit("...cannot display weather for tab %s" % (tab))
-            tab = (tab + 1) % (TAB_NB)
+            tab = (tab + step) % (TAB_NB)
         else:
             print_exit("...weather info displayed for tab %s" % (tab))
 
-    display_tab_status(display, tab, TAB_NB)
-    display.update()
+    display_tab_status(display, tab % LOC_TAB_NB, LOC_TAB_NB)
+    display_update(display, frame_hash("weather", tab, weather_content(tab)))
 
-    return 
+    return tab
 
 
 #-------------------------------------------------
 #		Main
 #-------------------------------------------------
 
-def weather():
-    '''Main loop to displays weather tabs according to the key pressed'''
+def wait_weather(t):
+    '''Waits for a key pressed, returns the tabs updated meanwhile'''
 
-    global tab
+    # Listens to the updates pushed by the local Pi while awake (imported once idle only)
+    from push_badger import push_listen
+    dirty = push_listen(display, read_weather_line)
 
-    tab = 0
-    
-    changed = False
-    renew = True
-
-    while True:
-
-        if renew:
-            print_entry("Collecting weather data...")
-            get_weather_forecast()
-            renew = False
-            changed = True
-            print_exit("...weather data collected")
-
-        if changed:
-            print_entry("Generating weather page...")
-            display_weather_tab()
-            changed = False
-            print_exit("...weather data displayed")
-            print_entry("Waiting for key pressed...")
-
-        # Call halt in a loop, on battery this switches off power.
-        # On USB, the app will exit when A+C is pressed because the launcher picks that up.
-        display.halt()
-
-        if display.pressed(badger2040.BUTTON_DOWN):
-            print_exit("...button down detected")
-            tab += 1
-            tab = tab % (TAB_NB)
-            changed = True
-
-        if display.pressed(badger2040.BUTTON_UP):
-            print_exit("...button up detected")
-            tab -= 1
-            tab = tab % (TAB_NB)
-            changed = True
-        
-        if display.pressed(badger2040.BUTTON_A):
-            print_exit("...button ASTRO detected")
-            launch_pages("astro")
-        
-        if display.pressed(badger2040.BUTTON_B):
-            print_exit("...button WEATHER detected")
-            renew = True
-            changed = True
-
-        if display.pressed(badger2040.BUTTON_C):
-            print_exit("...button DATA detected")
-            launch_pages("data")
+    # Call halt in a loop, on battery this switches off power.
+    # On USB, the app will exit when A+C is pressed because the launcher picks that up.
+    if dirty is None:
+        stats_halt(display)
+    return dirty
+
+
+def weather():
+    '''Main loop to displays weather tabs according to the key pressed, while weather data is fetched in background'''
+
+    run_page(display, "weather", 0, TAB_NB, get_weather_forecast, display_weather_tab, wait_weather)
+    return
 
 
 # Start of the script